@@ -0,0 +1,25 @@
+# agents/__init__.py
+"""
+팀별 에이전트 노드의 단일 공개 지점.
+
+팀마다 워커/평가자 정의는 agents/teamN_agents.py 하나씩만 존재해야 합니다.
+(같은 이름의 중복 모듈이 생기면 나중에 import된 쪽이 조용히 이기고,
+프롬프트/파서/클라이언트 초기화도 이중으로 실행됩니다.)
+그래프 배선은 이 재노출 목록만 사용하세요.
+"""
+
+from agents.team1_agents import process_question, evaluate_question, process_and_evaluate_question
+from agents.team2_agents import rag_search, web_search, parallel_search, evaluate_documents
+from agents.team3_agents import generate_answer, evaluate_answer
+
+__all__ = [
+    "process_question",
+    "process_and_evaluate_question",
+    "evaluate_question",
+    "rag_search",
+    "web_search",
+    "parallel_search",
+    "evaluate_documents",
+    "generate_answer",
+    "evaluate_answer",
+]
@@ -0,0 +1,202 @@
+# agents/eval_cache.py
+"""
+평가자 LLM 호출 결과의 프로세스 내 캐시.
+
+평가자들은 temperature=0으로 (프롬프트, 상태 필드)에 대한 순수 함수처럼 동작하므로,
+같은 (질문, 쿼리, 문서) 조합이 재시도 중 다시 들어오면 LLM을 다시 부를 필요가 없습니다.
+내용 해시를 키로 하는 단순 LRU 캐시로 반복 호출을 즉시 반환합니다.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+
+class EvalResultCache:
+    """내용 주소(content-addressed) 방식의 소형 LRU 캐시."""
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        # ttl(초)이 주어지면 만료된 엔트리는 미스로 처리합니다.
+        # (temperature=0 판정은 결정적이라 기본은 무기한 유지)
+        self.ttl = ttl
+        self._store: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (ts, value)
+        # 병렬 평가/투기적 실행 경로가 여러 스레드에서 동시에 접근하므로 잠금 보호
+        self._lock = threading.Lock()
+        # 관측용 카운터 (캐시 효율 확인)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """입력 문자열들을 합쳐 고정 길이 해시 키를 만듭니다."""
+        h = hashlib.blake2b(digest_size=16)
+        for p in parts:
+            h.update((p or "").encode("utf-8", "ignore"))
+            h.update(b"\x1f")  # 필드 경계 구분자
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None:
+                ts, value = entry
+                if self.ttl is not None and (time.monotonic() - ts) > self.ttl:
+                    del self._store[key]
+                else:
+                    self._store.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store[key] = (time.monotonic(), value)
+            self._store.move_to_end(key)
+            if len(self._store) > self.maxsize:
+                self._store.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._store)
+
+
+class SemanticEvalCache:
+    """
+    임베딩 유사도 기반 평가 결과 캐시.
+
+    정확 일치(내용 해시 dict)를 먼저 확인하고, 실패하면 FAISS IndexFlatIP에서
+    코사인 유사도 ≥ threshold 인 과거 키를 찾아 그 결과를 재사용합니다.
+    doc_hash가 주어지면 유사도 적중을 '같은 문서 해시'인 엔트리로 제한합니다
+    (문서는 정확 일치, 질문만 퍼지 매칭 — 다른 문서의 판정이 섞이는 것을 방지).
+    임베딩 1회(text-embedding-3-small)는 판정 LLM 1회보다 훨씬 싸고 빠르므로,
+    재시도 중 문서 미리보기가 조금 달라져도 평가 라운드트립을 건너뛸 수 있습니다.
+
+    FAISS/임베딩 클라이언트는 실제 사용 시점에 지연 로드되며, 엔트리는
+    TTL(초)이 지나면 무효 처리됩니다. 용량 초과 시에는 인덱스를 통째로
+    비웁니다(행 단위 삭제보다 단순하고, 캐시 특성상 손실이 무해함).
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600.0,
+                 maxsize: int = 512, embed_model: str = "text-embedding-3-small",
+                 persist_path: Optional[str] = None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._embed_model = embed_model
+        # 영속화(옵션): add() 시 (해시, 임베딩, 결과)를 JSON-lines로 append하고,
+        # 다음 프로세스가 첫 사용 시점에 읽어 캐시를 웜업합니다.
+        # 임베딩 벡터를 함께 저장하므로 웜업에 임베딩 API 호출이 없습니다.
+        self._persist_path = persist_path
+        self._warmed = persist_path is None
+        self._exact: dict = {}          # 내용 해시 → 행 번호
+        self._entries: List[tuple] = []  # 행 번호 → (만료 시각, 결과, 문서 해시)
+        self._index = None               # faiss.IndexFlatIP (지연 생성)
+        self._embeddings = None          # OpenAIEmbeddings (지연 생성)
+        self.hits = 0           # 정확 일치 적중
+        self.semantic_hits = 0  # 유사도 적중
+        self.misses = 0
+
+    def _embed(self, text: str):
+        import numpy as np
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(model=self._embed_model)
+        vec = np.asarray(self._embeddings.embed_query(text), dtype="float32")
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def _alive(self, row: int) -> bool:
+        expires_at = self._entries[row][0]
+        return time.monotonic() < expires_at
+
+    def _add_row(self, key: str, vec, value: Any, doc_hash: Optional[str] = None) -> None:
+        import faiss
+        if len(self._entries) >= self.maxsize:
+            self._exact.clear()
+            self._entries.clear()
+            self._index = None
+        if self._index is None:
+            self._index = faiss.IndexFlatIP(vec.shape[0])
+        self._index.add(vec.reshape(1, -1))
+        # 웜업된 엔트리는 로드 시점부터 TTL을 새로 시작합니다.
+        self._entries.append((time.monotonic() + self.ttl, value, doc_hash))
+        self._exact[key] = len(self._entries) - 1
+
+    def _warm_from_disk(self) -> None:
+        if self._warmed:
+            return
+        self._warmed = True
+        try:
+            import numpy as np
+            with open(self._persist_path, encoding="utf-8") as f:
+                loaded = 0
+                for line in f:
+                    if loaded >= self.maxsize:
+                        break
+                    rec = json.loads(line)
+                    vec = np.asarray(rec["vec"], dtype="float32")
+                    self._add_row(rec["key"], vec, rec["value"], rec.get("doc"))
+                    loaded += 1
+            if loaded:
+                print(f"♨️ 시맨틱 캐시 웜업: {loaded}개 엔트리 로드 ({self._persist_path})")
+        except FileNotFoundError:
+            pass  # 첫 실행 — 아직 저장된 캐시 없음
+        except Exception as e:
+            print(f"⚠️ 시맨틱 캐시 웜업 실패(무시): {e}")
+
+    def lookup(self, text: str, doc_hash: Optional[str] = None) -> Optional[Any]:
+        self._warm_from_disk()
+        # 1) 정확 일치 — 임베딩 호출조차 필요 없음.
+        # 키에 doc_hash를 반드시 포함합니다: 질문 텍스트는 라운드 내 모든
+        # 문서에 동일하므로, 빼면 첫 문서의 판정을 나머지 전부가 상속합니다.
+        key = EvalResultCache.make_key(text, doc_hash or "")
+        row = self._exact.get(key)
+        if row is not None and self._alive(row):
+            self.hits += 1
+            return self._entries[row][1]
+
+        # 2) 유사도 검색
+        if self._index is None or self._index.ntotal == 0:
+            self.misses += 1
+            return None
+        vec = self._embed(text)
+        # doc_hash 제한이 있으면 최상위 1건이 다른 문서일 수 있으므로 여유 있게 조회
+        top_k = 5 if doc_hash is not None else 1
+        scores, rows = self._index.search(vec.reshape(1, -1), top_k)
+        for score, row in zip(scores[0], rows[0]):
+            row = int(row)
+            if row < 0 or float(score) < self.threshold:
+                break  # 점수 내림차순이므로 이후는 전부 미달
+            if not self._alive(row):
+                continue
+            if doc_hash is not None and self._entries[row][2] != doc_hash:
+                continue
+            self.semantic_hits += 1
+            return self._entries[row][1]
+        self.misses += 1
+        return None
+
+    def add(self, text: str, value: Any, doc_hash: Optional[str] = None) -> None:
+        self._warm_from_disk()
+        vec = self._embed(text)
+        # lookup과 동일하게 doc_hash를 키에 포함해, 문서마다 별도의 정확
+        # 일치 엔트리가 공존하게 합니다. (빼면 라운드 내 마지막 문서가
+        # _exact 슬롯을 계속 덮어써 이전 문서 엔트리가 도달 불가가 됨)
+        key = EvalResultCache.make_key(text, doc_hash or "")
+        self._add_row(key, vec, value, doc_hash)
+        if self._persist_path:
+            try:
+                with open(self._persist_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "vec": vec.tolist(), "value": value,
+                                        "doc": doc_hash},
+                                       ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"⚠️ 시맨틱 캐시 영속화 실패(무시): {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,75 +1,150 @@
 
 # agents/team1_agents.py
 
-import json
-import uuid
+import asyncio
+import functools
+import re
 from typing import List, Dict, Any
 
+import numpy as np
+
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.messages import AIMessage, ToolMessage, HumanMessage
 from pydantic import BaseModel, Field
-from utility_tools import classify_simple_query
+from utility_tools import classify_simple_query, get_chat_llm, json_dumps, next_tool_call_id
 
 import config
 from state import AgentState
+from agents.eval_cache import EvalResultCache, SemanticEvalCache
+
+# 질문 평가 결과 캐시: temperature=0이므로 같은 입력 조합은 재평가하지 않음
+_question_eval_cache = EvalResultCache(maxsize=256)
+
+# 의미 기반 질문 캐시(옵션): 표현만 다른 반복 질문의 분석 결과를 재사용
+_question_sem_cache = None
+
+
+def _get_question_semantic_cache() -> SemanticEvalCache:
+    global _question_sem_cache
+    if _question_sem_cache is None:
+        _question_sem_cache = SemanticEvalCache(
+            threshold=getattr(config, "TEAM1_SEMANTIC_CACHE_THRESHOLD", 0.92),
+            ttl=getattr(config, "SEMANTIC_CACHE_TTL", 3600.0),
+            embed_model=getattr(config, "SEMANTIC_CACHE_EMBED_MODEL", "text-embedding-3-small"),
+        )
+    return _question_sem_cache
 
 # --- Pydantic 스키마 (변경 없음) ---
 class QuestionProcessingResult(BaseModel):
     q_validity: bool = Field(description="사용자 질문이 답변 가능한 유효한 질문인지 여부 (True/False)")
     q_en_transformed: str = Field(description="사용자 질문을 명확하게 재구성한 영문 질문")
+    # 쿼리 수 상한(4개)을 올릴 경우, 평가자의 단일 프롬프트가 쿼리 수에 따라
+    # 길어지므로 쿼리별 병렬 평가(chain.batch)로 전환하는 것을 검토할 것.
     rag_queries: List[str] = Field(description="검색에 사용할 2-4개의 다양한 영문 RAG 쿼리 후보 리스트", min_items=2, max_items=4)
     output_format: List[str] = Field(description="요청된 출력 포맷 [type, language]", min_items=2, max_items=2)
 
-class QuestionEvaluationResult(BaseModel):
+class QuestionSemanticEvaluation(BaseModel):
     semantic_alignment: float = Field(ge=0.0, le=1.0, description="사용자 입력과 q_en_transformed의 의미적 정합성 점수 [0,1]")
-    format_compliance: bool
     rag_query_scores: List[float] = Field(default_factory=list)
     error_message: str = ""
 
-# --- Node 1: 질문 처리 (Worker) ---
-def process_question(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 1 (질문 처리) 실행 ---")
+class QuestionEvaluationResult(QuestionSemanticEvaluation):
+    # format_compliance는 LLM 판정이 아니라 아래 _check_format_compliance로
+    # 결정적으로 계산합니다. (순수 문자열 비교에 LLM 토큰을 쓰지 않음)
+    format_compliance: bool = False
 
-    manager_feedback = state.get("manager_feedback")
-    last_message = state['messages'][-1]
+class Team1CombinedResult(QuestionProcessingResult, QuestionSemanticEvaluation):
+    """융합 노드용: 생성(worker) 필드와 자기 평가(evaluator) 필드를 한 스키마로."""
+    pass
 
-    feedback_instructions = ""
-    if manager_feedback:
-        print(f"📝 매니저 피드백 수신: {manager_feedback}")
-        feedback_instructions = f"""
-        **IMPORTANT REVISION INSTRUCTION FROM MANAGER:**
-        The previous attempt was not good enough. You MUST incorporate the following feedback into your new result:
-        "{manager_feedback}"
-        """
-        state["manager_feedback"] = None
 
-    # Check for internal team feedback from the evaluator
-    if isinstance(last_message, ToolMessage) and last_message.name == "team1_evaluator" and last_message.content.startswith("retry"):
-        internal_feedback = last_message.content.replace("retry:", "").strip()
-        if internal_feedback:
-            print(f"📝 팀 내부 피드백 수신: {internal_feedback}")
-            feedback_instructions += f"""
-            **IMPORTANT INTERNAL FEEDBACK FOR REVISION:**
-            Your previous attempt failed the internal quality check. You MUST address the following issue:
-            "{internal_feedback}"
-            """
-        
-    user_input = next((msg.content for msg in reversed(state['messages']) if isinstance(msg, HumanMessage)), "")
-    if not user_input.strip():
-        return {"messages": [ToolMessage(content="fail: 입력된 질문이 없습니다.", name="team1_worker", tool_call_id=str(uuid.uuid4()))]}
+# 명시적 포맷/언어 요청 감지: 컴파일된 정규식으로 마이크로초 단위에 끝나는
+# 순수 문자열 판정이므로 LLM에게 맡기지 않습니다.
+_FMT_TYPE_PATTERNS = (
+    (re.compile(r"표로|테이블|\btable\b", re.IGNORECASE), "table"),
+    (re.compile(r"불릿|목록으로|bullet", re.IGNORECASE), "bulleted"),
+    (re.compile(r"보고서|리포트|\breport\b", re.IGNORECASE), "report"),
+)
+_FMT_LANG_PATTERNS = (
+    (re.compile(r"영어로|영문으로|in english", re.IGNORECASE), "en"),
+    (re.compile(r"한국어로|한글로|in korean", re.IGNORECASE), "ko"),
+)
 
-    # --- Simple Query Classification via Tool ---
+# 재시도 피드백 파싱: startswith + replace의 2회 스캔 대신 앵커드 정규식 1회
+_RETRY_RE = re.compile(r"^retry(?:_eval)?:?\s*(.*)", re.DOTALL)
+
+
+def _check_format_compliance(user_input: str, output_format) -> bool:
+    """output_format이 사용자의 명시적 요청(없으면 기본값 qa/ko)과 일치하는지 판정."""
+    if not (isinstance(output_format, (list, tuple)) and len(output_format) == 2):
+        return False
+    expected_type = next((v for rx, v in _FMT_TYPE_PATTERNS if rx.search(user_input)), "qa")
+    expected_lang = next((v for rx, v in _FMT_LANG_PATTERNS if rx.search(user_input)), "ko")
+    return [str(x).lower() for x in output_format] == [expected_type, expected_lang]
+
+
+def _detect_output_format(user_input: str):
+    """명시적 포맷/언어 요청이 감지되면 [type, language]를, 아니면 None을 반환."""
+    fmt_type = next((v for rx, v in _FMT_TYPE_PATTERNS if rx.search(user_input)), None)
+    fmt_lang = next((v for rx, v in _FMT_LANG_PATTERNS if rx.search(user_input)), None)
+    if fmt_type is None and fmt_lang is None:
+        return None
+    return [fmt_type or "qa", fmt_lang or "ko"]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_eval_embeddings():
+    """임베딩 평가용 클라이언트 (시맨틱 캐시와 같은 경량 모델을 공유)."""
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=getattr(config, "SEMANTIC_CACHE_EMBED_MODEL", "text-embedding-3-small"))
+
+
+# 앵커(user_input) 임베딩 프리페치 결과: 워커 LLM 호출과 겹쳐 미리 계산해 두면
+# 평가 시점에는 재작성 질문/쿼리만 임베딩하면 됩니다. (엔트리 수는 작게 제한)
+_ANCHOR_EMBED_MEMO: dict = {}
+_ANCHOR_EMBED_MEMO_MAX = 8
+
+
+def _prefetch_anchor_embedding(user_input: str) -> None:
+    """워커 호출 지연에 겹쳐 앵커 임베딩을 선계산합니다. (실패는 무시 — 평가 시 재계산)"""
+    if user_input in _ANCHOR_EMBED_MEMO:
+        return
     try:
-        check_simple = classify_simple_query.func(user_input)
-        print(f"🧩 classify_simple_query(LLM) → {check_simple}")
+        vec = np.asarray(_get_eval_embeddings().embed_query(user_input), dtype=np.float32)
+        vec /= (np.linalg.norm(vec) + 1e-12)
+        if len(_ANCHOR_EMBED_MEMO) >= _ANCHOR_EMBED_MEMO_MAX:
+            _ANCHOR_EMBED_MEMO.pop(next(iter(_ANCHOR_EMBED_MEMO)))
+        _ANCHOR_EMBED_MEMO[user_input] = vec
     except Exception as e:
-        print(f"⚠️ classify_simple_query 실행 실패: {e}")
-        check_simple = "No"
+        print(f"⚠️ 앵커 임베딩 프리페치 실패(무시): {e}")
+
+
+def _embed_eval(user_input: str, q_en_transformed: str, rag_queries: List[str]) -> "QuestionSemanticEvaluation":
+    """
+    (TEAM1_EMBED_EVAL=true) 판정 LLM 대신 임베딩 코사인 유사도로 채점합니다.
+    앵커(user_input)와 나머지 텍스트를 배치 1회로 임베딩해
+    semantic_alignment와 rag_query_scores를 한 번에 계산합니다.
+    (앵커가 프리페치돼 있으면 나머지 텍스트만 임베딩)
+    """
+    anchor = _ANCHOR_EMBED_MEMO.get(user_input)
+    texts = [q_en_transformed] + list(rag_queries)
+    if anchor is None:
+        texts = [user_input] + texts
+    vecs = np.asarray(_get_eval_embeddings().embed_documents(texts), dtype=np.float32)
+    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+    if anchor is None:
+        anchor, vecs = vecs[0], vecs[1:]
+    return QuestionSemanticEvaluation(
+        semantic_alignment=float(np.clip(np.dot(anchor, vecs[0]), 0.0, 1.0)),
+        rag_query_scores=[float(np.clip(np.dot(anchor, v), 0.0, 1.0)) for v in vecs[1:]],
+        error_message="",
+    )
+
 
-    parser = JsonOutputParser(p_object=QuestionProcessingResult)
-    prompt = PromptTemplate.from_template("""
+# 워커 프롬프트: 임포트 시 1회 구성. 스키마는 구조화 출력(function calling)으로
+# 서버측에서 강제되므로 format_instructions를 프롬프트에 싣지 않습니다.
+_WORKER_PROMPT = PromptTemplate.from_template("""
 You are the first-stage agent in a RAG pipeline.
 
 TASKS
@@ -90,24 +165,215 @@ TASKS
    - Normalize to lowercase. Return exactly two items, no more, no less.
 
 {feedback_instructions}
-                                          
-STRICT OUTPUT (JSON ONLY, no prose):
-{schema}
+
+{style_hint}
 
 USER INPUT:
 {user_input}
-""").partial(schema=parser.get_format_instructions())
-    llm = ChatOpenAI(
-        model=config.LLM_MODEL_TEAM1,
-        temperature=0.0,
-        model_kwargs={"response_format": {"type": "json_object"}}
+""")
+# 주의: 동적 필드(feedback/user_input)는 반드시 프롬프트 끝에 둡니다.
+# OpenAI 프롬프트 캐시는 최장 공통 '접두사'만 매칭하므로, 정적 지시문과
+# 스키마가 앞에 고정되어야 반복 호출에서 입력 토큰 캐시가 적중합니다.
+
+
+class _QuestionProcessingCore(BaseModel):
+    """포맷 기지(旣知) 특화 프롬프트용: output_format을 제외한 워커 출력."""
+    q_validity: bool = Field(description="사용자 질문이 답변 가능한 유효한 질문인지 여부 (True/False)")
+    q_en_transformed: str = Field(description="사용자 질문을 명확하게 재구성한 영문 질문")
+    rag_queries: List[str] = Field(description="검색에 사용할 2-4개의 다양한 영문 RAG 쿼리 후보 리스트", min_items=2, max_items=4)
+
+
+# 부분 평가(특화) 프롬프트: 정규식으로 포맷이 이미 확정된 입력에는 TASK 4와
+# output_format 스키마 전체를 제거한 짧은 프롬프트를 씁니다. (prefill 토큰 절감,
+# 확정된 [type, language]는 호출 후 결과에 직접 주입)
+_WORKER_PROMPT_FORMAT_KNOWN = PromptTemplate.from_template("""
+You are the first-stage agent in a RAG pipeline.
+
+TASKS
+1) q_validity: Decide if the user input is a valid, answerable question (True/False).
+   - false if too vague / missing constraints / unsafe.
+2) q_en_transformed: Rewrite the question into clear English (preserve domain terms, numbers, units). Do not include content about the output format.
+3) rag_queries: Generate 2-4 detailed and context-rich search queries that capture the full nuance of the user's input.
+   - Construct a query focused on the key entities and their relationships.
+   - Mix styles (keyword, semantic paraphrase, entity-focused, time-bounded) when applicable.
+   - Do NOT invent facts not implied by the user input. Return 2–4 items only.
+
+{feedback_instructions}
+
+{style_hint}
+
+USER INPUT:
+{user_input}
+""")
+
+
+@functools.lru_cache(maxsize=8)
+def _get_worker_chain(temperature: float, format_known: bool = False):
+    """
+    워커 체인을 (온도, 프롬프트 변형)별로 1회만 구성해 재사용합니다.
+    ChatOpenAI 생성은 검증/토크나이저 준비를 동반하므로 호출마다 반복하지 않고,
+    동적 값(feedback/user_input)은 partial이 아닌 invoke 입력으로 전달합니다.
+    """
+    # json_object 모드 + 텍스트 파싱 대신 구조화 출력을 사용합니다.
+    # 스키마가 서버측에서 강제되므로 파싱 실패 재시도 경로가 사라지고,
+    # format_instructions 분량만큼 프롬프트도 짧아집니다. (min/max items
+    # 제약이 있는 리스트 필드 때문에 strict json_schema 대신 평가자와 같은
+    # function_calling 방식을 사용)
+    llm = get_chat_llm(config.LLM_MODEL_TEAM1, temperature=temperature)
+    if format_known:
+        return _WORKER_PROMPT_FORMAT_KNOWN | llm.with_structured_output(_QuestionProcessingCore, method="function_calling")
+    return _WORKER_PROMPT | llm.with_structured_output(QuestionProcessingResult, method="function_calling")
+
+# --- Node 1: 질문 처리 (Worker) ---
+def process_question(state: AgentState) -> Dict[str, Any]:
+    print("--- AGENT: Team 1 (질문 처리) 실행 ---")
+
+    manager_feedback = state.get("manager_feedback")
+    last_message = state['messages'][-1]
+
+    feedback_instructions = ""
+    if manager_feedback:
+        print(f"📝 매니저 피드백 수신: {manager_feedback}")
+        feedback_instructions = f"""
+        **IMPORTANT REVISION INSTRUCTION FROM MANAGER:**
+        The previous attempt was not good enough. You MUST incorporate the following feedback into your new result:
+        "{manager_feedback}"
+        """
+        state["manager_feedback"] = None
+
+    # Check for internal team feedback from the evaluator
+    retry_match = (
+        _RETRY_RE.match(last_message.content)
+        if isinstance(last_message, ToolMessage) and last_message.name == "team1_evaluator"
+        else None
     )
-    chain = prompt.partial(feedback_instructions=feedback_instructions, schema=parser.get_format_instructions()) | llm | parser
+    if retry_match:
+        internal_feedback = retry_match.group(1).strip()
+        if internal_feedback:
+            print(f"📝 팀 내부 피드백 수신: {internal_feedback}")
+            feedback_instructions += f"""
+            **IMPORTANT INTERNAL FEEDBACK FOR REVISION:**
+            Your previous attempt failed the internal quality check. You MUST address the following issue:
+            "{internal_feedback}"
+            """
+        
+    # O(1) 상태 키 우선: user_input은 첫 실행에서 state에 저장되므로,
+    # 재시도/후속 노드에서는 전체 이력 역탐색을 건너뜁니다.
+    user_input = state.get("user_input") or next((msg.content for msg in reversed(state['messages']) if isinstance(msg, HumanMessage)), "")
+    if not user_input.strip():
+        return {"messages": [ToolMessage(content="fail: 입력된 질문이 없습니다.", name="team1_worker", tool_call_id=next_tool_call_id())]}
+
+    # 의미 기반 캐시(옵션): 피드백 없는 새 질문에 한해, 표현만 다른 유사 질문의
+    # 분석 결과를 재사용합니다. 적중 시 분류/워커 LLM 호출을 모두 생략합니다.
+    if getattr(config, "TEAM1_SEMANTIC_CACHE", False) and not feedback_instructions:
+        try:
+            cached = _get_question_semantic_cache().lookup(user_input)
+        except Exception as e:
+            print(f"⚠️ Team 1 시맨틱 캐시 조회 실패(무시): {e}")
+            cached = None
+        if cached is not None:
+            print("♻️ Team 1 시맨틱 캐시 적중 (LLM 호출 생략)")
+            cached_result = cached["result"]
+            return {
+                "user_input": user_input,
+                "q_en_transformed": cached_result.get("q_en_transformed", ""),
+                "is_simple_query": cached.get("is_simple", "No"),
+                "messages": [
+                    AIMessage(
+                        content="사용자 질문을 성공적으로 분석했습니다.",
+                        additional_kwargs=cached_result
+                    )
+                ]
+            }
+
+    # --- Simple Query Classification via Tool ---
+    # 분류 LLM 호출은 워커 결과와 무관하므로 워커 호출과 동시에 실행합니다.
+    # (직렬이던 왕복 1회가 워커 호출 지연에 겹쳐 사라짐)
+    def _classify() -> str:
+        try:
+            res = classify_simple_query.func(user_input)
+            print(f"🧩 classify_simple_query(LLM) → {res}")
+            return res
+        except Exception as e:
+            print(f"⚠️ classify_simple_query 실행 실패: {e}")
+            return "No"
+
+    # 런타임 부분 평가: 포맷/언어가 정규식으로 이미 확정된 입력에는 TASK 4가
+    # 없는 특화 프롬프트를 써서 prefill을 줄이고, 확정값을 결과에 직접 주입합니다.
+    detected_format = _detect_output_format(user_input)
+
+    worker_inputs = {"user_input": user_input, "feedback_instructions": feedback_instructions}
+
+    def _is_usable(d) -> bool:
+        return isinstance(d, dict) and bool(d.get("rag_queries")) and bool(d.get("q_en_transformed"))
 
     try:
-        result_dict = chain.invoke({"user_input": user_input})
+        if getattr(config, "TEAM1_SPECULATIVE", False):
+            # 투기적 실행: 직렬 재시도의 K배 지연 대신, (온도, 스타일 힌트)를 달리한
+            # K개 후보를 동시에 생성하고 '가장 먼저 도착해 검증을 통과한' 후보를
+            # 즉시 채택합니다. (가장 느린 후보를 기다리지 않는 early-accept)
+            temps = getattr(config, "TEAM1_SPECULATIVE_TEMPS", (0.0, 0.3, 0.7))
+            hints = getattr(config, "TEAM1_SPECULATIVE_HINTS", ("",) * len(temps))
+            print(f"⚡ Team 1 투기적 실행: K={len(temps)}, temps={temps}")
+        else:
+            temps = (0.0,)
+            hints = ("",)
+
+        async def _run_concurrent():
+            # 분류 호출(_classify는 내부에서 예외를 삼킴)을 먼저 띄우고,
+            # 워커 후보들은 FIRST_COMPLETED 루프로 도착 즉시 검증합니다.
+            classify_task = asyncio.create_task(asyncio.to_thread(_classify))
+            # 임베딩 평가 모드면 앵커 임베딩도 워커 호출 지연에 겹쳐 선계산
+            prefetch_task = (
+                asyncio.create_task(asyncio.to_thread(_prefetch_anchor_embedding, user_input))
+                if getattr(config, "TEAM1_EMBED_EVAL", False) else None
+            )
+            def _invoke_worker(t, h):
+                chain = _get_worker_chain(t, detected_format is not None)
+                # 구조화 출력은 Pydantic 모델을 반환 — 하류(메시지 kwargs/캐시)는
+                # dict를 기대하므로 여기서 바로 풀어줍니다.
+                return chain.invoke({**worker_inputs, "style_hint": h}).model_dump()
+
+            worker_tasks = {
+                asyncio.create_task(asyncio.to_thread(_invoke_worker, t, h))
+                for t, h in zip(temps, hints)
+            }
+            winner = None
+            errors: list = []
+            pending = worker_tasks
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        cand = task.result()
+                    except Exception as task_err:
+                        errors.append(task_err)
+                        continue
+                    if _is_usable(cand):
+                        winner = cand
+                        break
+            # 채택 이후의 잔여 후보는 취소 (이미 시작된 스레드의 결과는 버려짐)
+            for task in pending:
+                task.cancel()
+            if prefetch_task is not None:
+                await prefetch_task
+            return await classify_task, winner, errors
+
+        check_simple, result_dict, errors = asyncio.run(_run_concurrent())
+        if result_dict is None:
+            if len(temps) == 1 and len(errors) == 1:
+                raise errors[0]
+            errs = [str(e) for e in errors]
+            raise ValueError(f"투기적 실행의 모든 후보가 무효입니다. ({'; '.join(errs) or 'empty rag_queries'})")
         if not result_dict.get("rag_queries"):
             raise ValueError("rag_queries가 비어있습니다.")
+        if detected_format is not None:
+            result_dict["output_format"] = detected_format
+        if getattr(config, "TEAM1_SEMANTIC_CACHE", False) and not feedback_instructions:
+            try:
+                _get_question_semantic_cache().add(user_input, {"result": result_dict, "is_simple": check_simple})
+            except Exception as e:
+                print(f"⚠️ Team 1 시맨틱 캐시 기록 실패(무시): {e}")
         return {
             "user_input": user_input,
             "q_en_transformed": result_dict.get("q_en_transformed", ""),
@@ -121,47 +387,19 @@ USER INPUT:
         }
     except Exception as e:
         print(f"❌ Team 1 (질문 처리) 오류: {e}")
-        return {"messages": [ToolMessage(content=f"fail: Team1 Worker 오류 - {e}", name="team1_worker", tool_call_id=str(uuid.uuid4()))]}
+        return {"messages": [ToolMessage(content=f"fail: Team1 Worker 오류 - {e}", name="team1_worker", tool_call_id=next_tool_call_id())]}
 
-# --- Node 2: 질문 평가 (Evaluator) ---
-def evaluate_question(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 1 (결과 평가) 실행 ---")
-    last_message = state['messages'][-1]
-    if not isinstance(last_message, AIMessage) or not last_message.additional_kwargs:
-        return {"messages": [ToolMessage(content="fail: Team1 평가자가 분석 결과를 찾을 수 없습니다.", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]}
-
-    current_retries = state.get("team1_retries", 0)
-
-    processed_data = last_message.additional_kwargs
-    user_input = next((msg.content for msg in state['messages'] if isinstance(msg, HumanMessage)), "")
 
-    q_validity = processed_data.get("q_validity", False)
-    q_en_transformed = processed_data.get("q_en_transformed", "")
-    rag_queries = processed_data.get("rag_queries", [])
-    output_format = processed_data.get("output_format", ["qa", "ko"])
-    
-    if not q_validity or not all([user_input, q_en_transformed, rag_queries]):
-        return {"messages": [ToolMessage(content="fail: 평가에 필요한 정보 부족", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]}
-    
-    parser = JsonOutputParser(p_object=QuestionEvaluationResult)
-    prompt = PromptTemplate.from_template("""
+@functools.lru_cache(maxsize=1)
+def _get_question_eval_chain():
+    """
+    질문 평가 체인을 1회만 구성해 재사용합니다. (프롬프트 컴파일,
+    구조화 출력 바인딩, LLM 클라이언트 생성이 호출마다 반복되지 않음)
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """
 You are the Team1 Supervisor evaluator. Using the information below, make binary judgments and per-query scores.
 
-[User Input]
-{user_input}
-
-[q_en_transformed]  # refined English question from the agent
-{q_en_transformed}
-
-[output_format]  # [type, language]
-{output_format}
-
-[default_format]
-{default_format}
-
-[rag_queries]
-{rag_queries_json}
-
 [Scoring Guide]
 
 You must evaluate the document using the following criteria.
@@ -176,50 +414,108 @@ You must select only one of the predefined values. Do not output any intermediat
      * 0.75 (Strong): satisfies most meaning/constraints with solid coverage, but small gaps remain  
      * 1.00 (Exact): fully faithful to meaning/constraints, immediately usable  
 
-2) format_compliance (bool)  
-   - Definition: Whether the `output_format` matches the user’s requested format.  
-   - Decision process:  
-     a) Analyze `user_input`. Did the user explicitly request a format/language (e.g., "표로", "영어로", "in a table", "in English")?  
-     b) If YES → `format_compliance = true` only if `output_format` exactly matches the user’s request (ignore default_format).  
-     c) If NO → `format_compliance = true` only if `output_format` == `default_format`.  
-
-3) rag_query_scores (list[float])  
+2) rag_query_scores (list[float])  
    - Definition: For each `rag_query`, score how well it captures the user’s requirements (keywords, constraints, time ranges, numbers/units, search-friendliness).  
    - Each value must be in [0.00, 1.00], continuous scale.  
    - The length MUST equal len(rag_queries).  
 
-4) error_message (str)  
-   - If the document is empty, irrelevant, too generic, or duplicated → return a short note in Korean.  
+3) error_message (str)
+   - If the document is empty, irrelevant, too generic, or duplicated → return a short note in Korean.
    - Otherwise return "" (empty string).
-                                          
-Return JSON ONLY. Do not include any additional text.
+"""),
+        ("human", """
+[User Input]
+{user_input}
 
-Output schema:
-{schema}
-""").partial(schema=parser.get_format_instructions()) # 프롬프트 내용은 기존과 동일
-    llm = ChatOpenAI(
-        model=config.LLM_MODEL_TEAM1,
-        temperature=0.0,
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
-    chain = prompt | llm | parser
+[q_en_transformed]  # refined English question from the agent
+{q_en_transformed}
+
+[output_format]  # [type, language]
+{output_format}
+
+[rag_queries]
+{rag_queries_json}
+"""),
+    ]) # format_compliance는 프롬프트에서 제거 — _check_format_compliance가 결정적으로 계산
+    # JSON 텍스트 파싱 대신 function calling 기반 구조화 출력을 사용합니다.
+    # 스키마가 서버측에서 강제되므로 꼬리 쉼표/코드펜스로 인한 파싱 실패가 없고,
+    # format_instructions 분량만큼 프롬프트 토큰도 절약됩니다.
+    llm = get_chat_llm(config.LLM_MODEL_TEAM1, temperature=0.0)
+    return prompt | llm.with_structured_output(QuestionSemanticEvaluation, method="function_calling")
+
+
+# --- Node 2: 질문 평가 (Evaluator) ---
+def evaluate_question(state: AgentState) -> Dict[str, Any]:
+    print("--- AGENT: Team 1 (결과 평가) 실행 ---")
+    # 평가 대상 탐색: 기본은 직전 메시지가 워커의 AIMessage여야 합니다.
+    # 뒤로 거슬러 올라가는 탐색은 평가자 자신의 retry_eval 마커로 돌아온
+    # 경우로 한정합니다 — 무조건 역탐색하면 워커가 fail: ToolMessage를 낸
+    # 라운드에서 이전에 이미 통과한 분석을 되살려 pass를 재발행하게 되어,
+    # 워커 실패와 매니저 피드백이 조용히 버려집니다.
+    tail = state['messages'][-1] if state['messages'] else None
+    if isinstance(tail, AIMessage) and tail.additional_kwargs:
+        last_message = tail
+    elif (isinstance(tail, ToolMessage) and tail.name == "team1_evaluator"
+          and str(tail.content).startswith("retry_eval")):
+        last_message = next(
+            (m for m in reversed(state['messages']) if isinstance(m, AIMessage) and m.additional_kwargs),
+            None,
+        )
+    else:
+        last_message = None
+    if last_message is None:
+        return {"messages": [ToolMessage(content="fail: Team1 평가자가 분석 결과를 찾을 수 없습니다.", name="team1_evaluator", tool_call_id=next_tool_call_id())]}
+
+    current_retries = state.get("team1_retries", 0)
+
+    processed_data = last_message.additional_kwargs
+    user_input = state.get("user_input") or next((msg.content for msg in state['messages'] if isinstance(msg, HumanMessage)), "")
+
+    q_validity = processed_data.get("q_validity", False)
+    q_en_transformed = processed_data.get("q_en_transformed", "")
+    rag_queries = processed_data.get("rag_queries", [])
+    output_format = processed_data.get("output_format", ["qa", "ko"])
+    
+    if not q_validity or not all([user_input, q_en_transformed, rag_queries]):
+        return {"messages": [ToolMessage(content="fail: 평가에 필요한 정보 부족", name="team1_evaluator", tool_call_id=next_tool_call_id())]}
+    
+    # 프롬프트 캐싱: 정적 지침/스키마를 system 메시지 앞부분에 고정하고
+    # 호출마다 달라지는 상태 필드는 human 메시지 뒤쪽에만 둡니다.
+    # (OpenAI 자동 prefix 캐싱은 공통 '접두사'만 재사용하므로 순서가 중요)
+    chain = _get_question_eval_chain()
 
     try:
-        result_dict = chain.invoke({
-            "user_input": user_input,
-            "q_en_transformed": q_en_transformed,
-            "output_format": json.dumps(output_format, ensure_ascii=False),
-            "default_format": json.dumps(["qa", "ko"], ensure_ascii=False),
-            "rag_queries_json": json.dumps(rag_queries, ensure_ascii=False)
-        })
-        result = QuestionEvaluationResult.model_validate(result_dict)
+        cache_key = EvalResultCache.make_key(
+            user_input, q_en_transformed,
+            json_dumps(output_format),
+            json_dumps(rag_queries),
+        )
+        result_dict = _question_eval_cache.get(cache_key)
+        if result_dict is None:
+            if getattr(config, "TEAM1_EMBED_EVAL", False):
+                print("⚡ Team 1 임베딩 평가 (판정 LLM 생략)")
+                result = _embed_eval(user_input, q_en_transformed, rag_queries)
+            else:
+                result = chain.invoke({
+                    "user_input": user_input,
+                    "q_en_transformed": q_en_transformed,
+                    "output_format": json_dumps(output_format),
+                    "rag_queries_json": json_dumps(rag_queries)
+                })
+            _question_eval_cache.put(cache_key, result.model_dump())
+        else:
+            print("♻️ Team 1 평가 캐시 적중 (LLM 호출 생략)")
+            result = QuestionSemanticEvaluation.model_validate(result_dict)
 
         if len(result.rag_query_scores) != len(rag_queries):
             raise ValueError("점수 리스트와 쿼리 리스트의 길이가 다릅니다.")
-        
-        passed = (result.semantic_alignment >= 0.8) and result.format_compliance
+
+        # 포맷 일치는 순수 문자열 비교라 LLM 없이 결정적으로 판정
+        format_ok = _check_format_compliance(user_input, output_format)
+        passed = (result.semantic_alignment >= 0.8) and format_ok
         if passed:
-            best_idx = max(range(len(result.rag_query_scores)), key=lambda i: result.rag_query_scores[i])
+            # argmax: 쿼리 수가 늘어나도 벡터화된 선택이 가능하도록 NumPy 사용
+            best_idx = int(np.argmax(result.rag_query_scores))
             best_query = rag_queries[best_idx]
             
             return {
@@ -230,7 +526,7 @@ Output schema:
                     ToolMessage(
                         content="pass",
                         name="team1_evaluator",
-                        tool_call_id=str(uuid.uuid4()),
+                        tool_call_id=next_tool_call_id(),
                         additional_kwargs={
                             "q_en_transformed": q_en_transformed,
                             "output_format": output_format,
@@ -240,29 +536,151 @@ Output schema:
                 ]
             }
         else:
-            err = result.error_message or "Team1: 평가 기준 미달 (Team1: Evaluation criteria not met)"
+            if not format_ok:
+                err = "output_format이 사용자 요청(또는 기본값 qa/ko)과 일치하지 않습니다."
+            else:
+                err = result.error_message or "Team1: 평가 기준 미달 (Team1: Evaluation criteria not met)"
             if current_retries < config.MAX_RETRIES_TEAM1:
                 print(f"🔁 Team 1 평가 실패. 재시도를 요청합니다. ({current_retries + 1}/{config.MAX_RETRIES_TEAM1})")
                 return {
                     "team1_retries": current_retries + 1,
-                    "messages": [ToolMessage(content=f"retry: {err}", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]
+                    "messages": [ToolMessage(content=f"retry: {err}", name="team1_evaluator", tool_call_id=next_tool_call_id())]
                     }
             else:
                 print(f"❌ Team 1 최종 실패 (재시도 {config.MAX_RETRIES_TEAM1}회 초과).")
                 return {
                     "team1_retries": current_retries + 1,
-                    "messages": [ToolMessage(content=f"fail: {err}", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]
+                    "messages": [ToolMessage(content=f"fail: {err}", name="team1_evaluator", tool_call_id=next_tool_call_id())]
                     }
              
     except Exception as e:
         print(f"❌ Team 1 (결과 평가) 오류: {e}")
         if current_retries < config.MAX_RETRIES_TEAM1:
+            # 워커 출력 자체는 유효하므로 평가만 다시 수행합니다.
+            # (워커 LLM 호출 1회를 아끼는 retry_eval 경로)
             return {
                 "team1_retries": current_retries + 1,
-                "messages": [ToolMessage(content="retry", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]
+                "messages": [ToolMessage(content="retry_eval", name="team1_evaluator", tool_call_id=next_tool_call_id())]
                 }
         else:
             return {
                 "team1_retries": current_retries + 1,
-                "messages": [ToolMessage(content=f"fail: Team1 Evaluator 오류 - {e}", name="team1_evaluator", tool_call_id=str(uuid.uuid4()))]
+                "messages": [ToolMessage(content=f"fail: Team1 Evaluator 오류 - {e}", name="team1_evaluator", tool_call_id=next_tool_call_id())]
             }
+
+
+# --- (옵션) 융합 노드: 생성 + 자기 평가를 LLM 1회 호출로 ---
+_fused_parser = JsonOutputParser(p_object=Team1CombinedResult)
+_FUSED_PROMPT = PromptTemplate.from_template("""
+You are the first-stage agent in a RAG pipeline. You must BOTH produce the
+analysis AND immediately self-evaluate it, in a single JSON object.
+
+TASKS (produce)
+1) q_validity: Decide if the user input is a valid, answerable question (True/False).
+2) q_en_transformed: Rewrite the question into clear English (preserve domain terms, numbers, units).
+3) rag_queries: Generate 2-4 detailed, context-rich search queries (mixed styles; no invented facts).
+4) output_format: ALWAYS a 2-item array [type, language]; type ∈ ["report","table","bulleted","qa"],
+   language ∈ ["ko","en"]; defaults "qa"/"ko" apply independently when unclear; lowercase.
+
+TASKS (self-evaluate the fields you just produced)
+5) semantic_alignment: one of {{0.00, 0.25, 0.50, 0.75, 1.00}} — how faithfully
+   q_en_transformed reflects the user input's meaning and constraints.
+6) rag_query_scores: one score in [0,1] PER rag_query (same length as rag_queries).
+7) error_message: short Korean note when any produced field is weak; else "".
+
+Be honest in the self-evaluation — downstream routing retries on low scores.
+
+STRICT OUTPUT (JSON ONLY, no prose):
+{schema}
+
+USER INPUT:
+{user_input}
+""").partial(schema=_fused_parser.get_format_instructions())
+
+
+@functools.lru_cache(maxsize=1)
+def _get_fused_chain():
+    """융합(생성+자기평가) 체인을 1회만 구성해 재사용합니다."""
+    llm = get_chat_llm(config.LLM_MODEL_TEAM1, temperature=0.0, json_mode=True)
+    return _FUSED_PROMPT | llm | _fused_parser
+
+
+def process_and_evaluate_question(state: AgentState) -> Dict[str, Any]:
+    """
+    (TEAM1_FUSED=true 전용 노드) 워커+평가자를 LLM 1회 호출로 융합합니다.
+    왕복 1회와 공유 컨텍스트 prefill 1회가 사라집니다. 피드백이 있는 재시도,
+    융합 호출 실패, 자기 평가 기준 미달 시에는 기존 2단계 경로로 폴백해
+    독립 평가자의 품질 신호를 유지합니다.
+    """
+    print("--- AGENT: Team 1 (융합: 처리+평가) 실행 ---")
+
+    def _fallback():
+        # 기존 2단계 경로를 같은 노드 안에서 순차 실행하고 상태 업데이트를 병합
+        upd1 = process_question(state)
+        merged = {**state, **upd1}
+        merged["messages"] = list(state.get("messages", [])) + list(upd1.get("messages", []))
+        upd2 = evaluate_question(merged)
+        combined = {**upd1, **upd2}
+        combined["messages"] = list(upd1.get("messages", [])) + list(upd2.get("messages", []))
+        return combined
+
+    last_message = state['messages'][-1]
+    has_feedback = bool(state.get("manager_feedback")) or (
+        isinstance(last_message, ToolMessage)
+        and last_message.name in ("team1_evaluator", "team1_fused")
+        and last_message.content.startswith("retry")
+    )
+    if has_feedback:
+        print("🔁 Team 1 융합: 피드백 재시도 — 2단계 경로로 폴백")
+        return _fallback()
+
+    # O(1) 상태 키 우선: user_input은 첫 실행에서 state에 저장되므로,
+    # 재시도/후속 노드에서는 전체 이력 역탐색을 건너뜁니다.
+    user_input = state.get("user_input") or next((msg.content for msg in reversed(state['messages']) if isinstance(msg, HumanMessage)), "")
+    if not user_input.strip():
+        return {"messages": [ToolMessage(content="fail: 입력된 질문이 없습니다.", name="team1_worker", tool_call_id=next_tool_call_id())]}
+
+    try:
+        check_simple = classify_simple_query.func(user_input)
+    except Exception as e:
+        print(f"⚠️ classify_simple_query 실행 실패: {e}")
+        check_simple = "No"
+
+    try:
+        result = Team1CombinedResult.model_validate(_get_fused_chain().invoke({"user_input": user_input}))
+        rag_queries = result.rag_queries
+        passed = (
+            result.q_validity
+            and result.semantic_alignment >= 0.8
+            and _check_format_compliance(user_input, result.output_format)
+            and len(result.rag_query_scores) == len(rag_queries)
+        )
+        if not passed:
+            print(f"🔁 Team 1 융합: 자기 평가 기준 미달 — 2단계 경로로 폴백 ({result.error_message or 'low self-score'})")
+            return _fallback()
+
+        best_query = rag_queries[int(np.argmax(result.rag_query_scores))]
+        worker_fields = QuestionProcessingResult.model_validate(result.model_dump()).model_dump()
+        return {
+            "user_input": user_input,
+            "q_en_transformed": result.q_en_transformed,
+            "best_rag_query": best_query,
+            "is_simple_query": check_simple,
+            "team1_retries": 0,
+            "messages": [
+                AIMessage(content="사용자 질문을 성공적으로 분석했습니다.", additional_kwargs=worker_fields),
+                ToolMessage(
+                    content="pass",
+                    name="team1_evaluator",
+                    tool_call_id=next_tool_call_id(),
+                    additional_kwargs={
+                        "q_en_transformed": result.q_en_transformed,
+                        "output_format": result.output_format,
+                        "best_rag_query": best_query,
+                    }
+                ),
+            ]
+        }
+    except Exception as e:
+        print(f"⚠️ Team 1 융합 호출 실패 — 2단계 경로로 폴백: {e}")
+        return _fallback()
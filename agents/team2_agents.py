@@ -1,24 +1,144 @@
 # agents/team2_agents.py
 
+import asyncio
+import functools
 import json
-import uuid
+import re
+import time
 from typing import List, Dict, Any
 
+import numpy as np
+
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import ToolMessage
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 import config
+from log_utils import log
 from state import AgentState
-from utility_tools import vector_store_rag_search, deep_research_web_search, format_docs
+from agents.eval_cache import EvalResultCache, SemanticEvalCache
+from utility_tools import vector_store_rag_search, deep_research_web_search, format_docs, get_chat_llm, truncate_middle, next_tool_call_id
 
 semantic_relevance_THRESHOLD = 0.5
 is_detailed_THRESHOLD = 0.5
 rag_search_num = 7
 web_search_num = 5
 total_docs_required = 5
+# 판정 프롬프트에 넣는 문서 미리보기 상한(문자). ~300 토큰 수준으로 잘라
+# 판정 호출의 입력 토큰과 지연을 문서 길이와 무관하게 bound 합니다.
+eval_preview_max_chars = 1200
+# 문서 판정 응답의 출력 토큰 상한. 점수 2개 + 짧은 error_message뿐이라
+# 이 이상은 포맷 이탈(잡설)이므로 비용/지연을 하드캡합니다.
+eval_max_tokens = 128
+
+# 문서 평가 결과 캐시: 같은 (질문, 쿼리, 문서) 조합은 재시도 시 LLM을 다시 부르지 않음
+_doc_eval_cache = EvalResultCache(maxsize=512)
+
+# 의미 기반 캐시(옵션): 정확 일치가 빗나가도 유사한 조합의 판정을 재사용
+_doc_eval_semantic_cache = None
+
+
+def _get_semantic_cache() -> SemanticEvalCache:
+    global _doc_eval_semantic_cache
+    if _doc_eval_semantic_cache is None:
+        _doc_eval_semantic_cache = SemanticEvalCache(
+            threshold=getattr(config, "SEMANTIC_CACHE_THRESHOLD", 0.95),
+            ttl=getattr(config, "SEMANTIC_CACHE_TTL", 3600.0),
+            embed_model=getattr(config, "SEMANTIC_CACHE_EMBED_MODEL", "text-embedding-3-small"),
+            persist_path=getattr(config, "SEMANTIC_CACHE_PERSIST_PATH", "") or None,
+        )
+    return _doc_eval_semantic_cache
+
+def _eval_model() -> str:
+    """문서 판정에 쓸 모델명. LLM_MODEL_TEAM2_EVAL_FAST가 지정돼 있으면
+    그쪽(경량 모델)을 씁니다 — 판정은 구조화 분류 과제라 대형 모델이 불필요."""
+    return getattr(config, "LLM_MODEL_TEAM2_EVAL_FAST", "") or config.LLM_MODEL_TEAM2_EVAL
+
+
+def _transient_error_types() -> tuple:
+    """일시적(재시도 가치가 있는) 오류 타입들. openai 미설치 환경도 허용.
+
+    APIError(모든 SDK 오류의 베이스)는 넣지 않습니다 — 인증 실패나 잘못된
+    요청 같은 영구 오류까지 백오프 재시도하게 되기 때문입니다. 5xx는
+    InternalServerError로만 잡습니다.
+    """
+    try:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        return (RateLimitError, InternalServerError, APITimeoutError, APIConnectionError, TimeoutError)
+    except ImportError:
+        return (TimeoutError,)
+
+
+# 일시 오류 재시도: 429/5xx/타임아웃 1건이 fail: 메시지와 전체 재검색 사이클로
+# 번지지 않도록, 외부 호출은 지수 백오프+지터로 최대 3회 재시도합니다.
+try:
+    from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+    _transient_retry = retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=1, max=10),
+        retry=retry_if_exception_type(_transient_error_types()),
+        reraise=True,
+    )
+except ImportError:  # tenacity 미설치 시 재시도 없이 기존 동작
+    def _transient_retry(fn):
+        return fn
+
+
+@_transient_retry
+def _do_rag_search(query: str, top_k: int, rerank_k: int):
+    return vector_store_rag_search.func(query, top_k=top_k, rerank_k=rerank_k)
+
+
+@_transient_retry
+def _do_web_search(query: str, max_results: int):
+    return deep_research_web_search.func(query, max_results=max_results)
+
+
+@_transient_retry
+def _do_judge(chain, inputs: Dict[str, Any]):
+    return chain.invoke(inputs)
+
+
+# 스트리밍 평가용: 누적 버퍼에서 두 점수 필드를 먼저 찾아내기 위한 패턴
+# (각 값 뒤에 쉼표/중괄호가 와야 완결로 간주 — 청크 경계가 "0."에서 끊긴
+# 미완성 숫자를 0.0으로 읽어 오탈락·오캐싱하는 것을 방지)
+_EVAL_SCORES_RE = re.compile(
+    r'"semantic_relevance"\s*:\s*([0-9.]+)\s*,.*?"is_detailed"\s*:\s*([0-9.]+)\s*[,}]',
+    re.DOTALL,
+)
+# 첫 점수만으로도 탈락을 확정할 수 있는 경우를 위한 패턴
+# (뒤에 쉼표/공백이 와야 값이 완결된 것으로 간주 — "0."에서 끊긴 스트림 오탐 방지)
+_EVAL_SEM_ONLY_RE = re.compile(r'"semantic_relevance"\s*:\s*([0-9.]+)\s*[,}]')
+
+
+def _stream_doc_eval(prompt, llm, parser, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    평가 JSON을 스트리밍으로 받으며 두 점수 필드가 확정되는 즉시 판단합니다.
+    탈락 판정이면 error_message 꼬리 토큰을 기다리지 않고 스트림을 닫아
+    재시도(가장 느린 경로)의 지연을 줄입니다.
+    """
+    buf = ""
+    stream = (prompt | llm).stream(inputs)
+    try:
+        for chunk in stream:
+            buf += chunk.content or ""
+            # 첫 점수가 이미 미달이면 두 번째 점수조차 기다리지 않습니다.
+            m = _EVAL_SEM_ONLY_RE.search(buf)
+            if m and float(m.group(1)) < semantic_relevance_THRESHOLD:
+                return {"semantic_relevance": float(m.group(1)), "is_detailed": 0.0,
+                        "error_message": "rejected (stream early-exit: low relevance)"}
+            m = _EVAL_SCORES_RE.search(buf)
+            if m:
+                sem, det = float(m.group(1)), float(m.group(2))
+                if sem < semantic_relevance_THRESHOLD or det < is_detailed_THRESHOLD:
+                    # 이미 탈락 확정 — 남은 토큰을 기다릴 필요 없음
+                    return {"semantic_relevance": sem, "is_detailed": det,
+                            "error_message": "rejected (stream early-exit)"}
+    finally:
+        stream.close()
+    return parser.parse(buf)
 
 # --- 단일 문서 평가 스키마 ---
 class DocEvaluationResult(BaseModel):
@@ -26,10 +146,351 @@ class DocEvaluationResult(BaseModel):
     is_detailed: float = Field(ge=0.0, le=1.0, description="문서가 충분히 구체적이고 세부적인지를 나타내는 점수 [0,1]")
     error_message: str = ""
 
+# --- 배치 평가 스키마: 문서 순서와 동일한 순서의 결과 배열 ---
+class BatchDocEvaluationResult(BaseModel):
+    results: List[DocEvaluationResult] = Field(default_factory=list, description="입력 문서 순서와 동일한 순서의 문서별 평가 결과")
+
+
+# 모듈 스코프에서 1회 빌드해 재사용하는 검증 어댑터.
+# 루프 안의 model_validate는 호출마다 스키마 디스패치를 반복하므로,
+# 문서 7~12건 × 여러 라운드에서는 미세하지만 누적 비용이 됩니다.
+_EVAL_ADAPTER = TypeAdapter(DocEvaluationResult)
+
+
+def _response_format_for(model_cls) -> dict:
+    """
+    Pydantic 모델로부터 OpenAI json_schema(strict) 응답 포맷을 만듭니다.
+    json_object 모드와 달리 서버가 스키마 자체를 강제하므로, 꼬리 쉼표나
+    누락 키로 인한 파싱 실패/재시도 분기가 사라지고 프롬프트에
+    format_instructions를 실어 보낼 필요도 없습니다.
+    """
+    schema = model_cls.model_json_schema()
+
+    # strict 모드 요건: 중첩 객체까지 포함해 모든 프로퍼티 required + 추가 키 금지
+    def _strictify(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"].keys())
+            for v in node.values():
+                _strictify(v)
+        elif isinstance(node, list):
+            for v in node:
+                _strictify(v)
+
+    _strictify(schema)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model_cls.__name__, "schema": schema, "strict": True},
+    }
+
+
+def _batch_prefill_doc_evals(previews, q_en_transformed: str, rag_query: str) -> None:
+    """
+    한 라운드의 미평가 문서들을 판정 LLM '한 번'의 호출로 평가해
+    정확 캐시를 선채웁니다. (문서별 호출 N회 → 1회: 고정 루브릭 토큰을
+    문서 수만큼 반복 지불하지 않고, 네트워크 왕복도 1회로 줄어듦)
+    결과 배열 길이가 어긋나거나 호출이 실패하면 캐시를 채우지 않고 조용히
+    돌아가며, 기존 문서별 평가 경로가 그대로 처리합니다.
+    """
+    pending: List[tuple] = []  # (cache_key, preview)
+    seen_keys = set()
+    for preview in previews:
+        key = EvalResultCache.make_key(q_en_transformed, rag_query, preview)
+        if key in seen_keys or _doc_eval_cache.get(key) is not None:
+            continue
+        seen_keys.add(key)
+        pending.append((key, preview))
+
+    if len(pending) < 2:
+        return  # 배치로 묶을 이득이 없음
+
+    chain = _get_batch_eval_chain()
+
+    docs_block = "\n\n".join(
+        f"### Document {i + 1}\n{preview}" for i, (_, preview) in enumerate(pending)
+    )
+    try:
+        log(f"📦 Team 2 배치 평가: 문서 {len(pending)}개를 1회 호출로 판정")
+        result = BatchDocEvaluationResult.model_validate_json(chain.invoke({
+            "q_en_transformed": q_en_transformed,
+            "rag_query": rag_query,
+            "docs_block": docs_block,
+        }).content)
+        if len(result.results) != len(pending):
+            raise ValueError(f"결과 수 불일치: {len(result.results)} != {len(pending)}")
+        for (key, _), r in zip(pending, result.results):
+            _doc_eval_cache.put(key, r.model_dump())
+    except Exception as e:
+        log(f"⚠️ Team 2 배치 평가 실패 — 문서별 평가로 폴백: {e}")
+
+
+def _parallel_prefill_doc_evals(previews, q_en_transformed: str, rag_query: str) -> None:
+    """
+    한 라운드의 미평가 문서들을 asyncio로 '동시에' 판정해 정확 캐시를
+    선채웁니다. (직렬 루프의 N×RTT가 ~1×RTT로 수렴. 배치 평가와 달리
+    문서별 루브릭 호출을 그대로 유지하므로 채점 분포가 변하지 않음)
+    세마포어로 동시성을 제한해 RPM/TPM 한도를 지키고, 개별 실패 문서는
+    캐시를 채우지 않고 기존 문서별 평가 경로가 그대로 처리합니다.
+    """
+    pending: List[tuple] = []  # (cache_key, preview)
+    seen_keys = set()
+    for preview in previews:
+        key = EvalResultCache.make_key(q_en_transformed, rag_query, preview)
+        if key in seen_keys or _doc_eval_cache.get(key) is not None:
+            continue
+        seen_keys.add(key)
+        pending.append((key, preview))
+
+    if len(pending) < 2:
+        return  # 동시 실행할 이득이 없음
+
+    _, _, _, chain = _get_doc_eval_chain()
+    limit = max(1, getattr(config, "MAX_CONCURRENCY_TEAM2_EVAL", 8))
+
+    async def _run_all():
+        sem = asyncio.Semaphore(limit)
+
+        async def _one(preview: str):
+            async with sem:
+                msg = await chain.ainvoke({
+                    "q_en_transformed": q_en_transformed,
+                    "rag_query": rag_query,
+                    "doc_text": preview,
+                })
+                return _EVAL_ADAPTER.validate_json(msg.content)
+
+        return await asyncio.gather(*[_one(p) for _, p in pending], return_exceptions=True)
+
+    try:
+        log(f"⚡ Team 2 병렬 평가: 문서 {len(pending)}개 동시 판정 (동시성 ≤ {limit})")
+        for (key, _), r in zip(pending, asyncio.run(_run_all())):
+            if isinstance(r, Exception):
+                log(f"⚠️ 병렬 평가 1건 실패 — 해당 문서는 문서별 경로로 폴백: {r}")
+                continue
+            _doc_eval_cache.put(key, r.model_dump())
+    except Exception as e:
+        log(f"⚠️ Team 2 병렬 평가 실패 — 문서별 평가로 폴백: {e}")
+
+
+def _batch_api_prefill_doc_evals(previews, q_en_transformed: str, rag_query: str) -> None:
+    """
+    (TEAM2_EVAL_MODE="batch") 한 라운드의 미평가 문서들을 OpenAI /v1/batches
+    엔드포인트로 일괄 판정해 정확 캐시를 선채웁니다. 토큰 비용이 대화식의
+    절반이지만 완료까지 오래 걸릴 수 있어(완료 창 24h) 재생 로그·야간 스윕
+    같은 비대화식 실행 전용입니다. 실패/만료 시 캐시를 채우지 않고 기존
+    문서별 평가 경로가 그대로 처리합니다.
+    """
+    pending: List[tuple] = []  # (cache_key, preview)
+    seen_keys = set()
+    for preview in previews:
+        key = EvalResultCache.make_key(q_en_transformed, rag_query, preview)
+        if key in seen_keys or _doc_eval_cache.get(key) is not None:
+            continue
+        seen_keys.add(key)
+        pending.append((key, preview))
+
+    if not pending:
+        return
+
+    single_doc_prompt, _, _, _ = _get_doc_eval_chain()
+    client = _get_direct_eval_client()
+    try:
+        lines = []
+        for key, preview in pending:
+            messages = [
+                {"role": "system" if m.type == "system" else "user", "content": m.content}
+                for m in single_doc_prompt.format_messages(
+                    q_en_transformed=q_en_transformed, rag_query=rag_query, doc_text=preview
+                )
+            ]
+            lines.append(json.dumps({
+                "custom_id": key,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": _eval_model(),
+                    "temperature": 0.0,
+                    "max_tokens": eval_max_tokens,
+                    "seed": getattr(config, "LLM_SEED", 42),
+                    "response_format": _response_format_for(DocEvaluationResult),
+                    "messages": messages,
+                },
+            }, ensure_ascii=False))
+
+        f = client.files.create(
+            file=("team2_eval_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = client.batches.create(
+            input_file_id=f.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        log(f"📮 Team 2 배치 API 평가 제출: 문서 {len(pending)}건 (batch {batch.id})")
+        poll = getattr(config, "TEAM2_EVAL_BATCH_POLL_SECONDS", 30)
+        while batch.status in ("validating", "in_progress", "finalizing"):
+            time.sleep(poll)
+            batch = client.batches.retrieve(batch.id)
+        if batch.status != "completed":
+            raise RuntimeError(f"배치 상태: {batch.status}")
+
+        filled = 0
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            obj = json.loads(line)
+            resp = (obj.get("response") or {}).get("body") or {}
+            choices = resp.get("choices") or []
+            if not choices:
+                continue
+            r = _EVAL_ADAPTER.validate_json(choices[0]["message"]["content"])
+            _doc_eval_cache.put(obj["custom_id"], r.model_dump())
+            filled += 1
+        log(f"📬 Team 2 배치 API 평가 완료: {filled}/{len(pending)}건 캐시 반영")
+    except Exception as e:
+        log(f"⚠️ Team 2 배치 API 평가 실패 — 문서별 평가로 폴백: {e}")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_batch_eval_chain():
+    """배치 평가 체인을 1회만 구성해 재사용합니다."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """
+You are a strict Quality Control Supervisor evaluator.
+You will receive SEVERAL documents at once. Evaluate EACH document independently
+against the user's question, using the same rubrics as a single-document review.
+
+[Scoring Guide — semantic_relevance] (per document, choose EXACTLY one)
+- 0.00 = None / 0.25 = Low / 0.50 = Partial / 0.75 = Strong / 1.00 = Exact
+  (alignment with the question's intent, entities, and constraints)
+
+[Scoring Guide — is_detailed] (per document, choose EXACTLY one)
+- 0.00 = None / 0.25 = Low / 0.50 = Partial / 0.75 = Strong / 1.00 = Exact
+  (specificity and sufficiency to support a reliable answer)
+
+[Error Message]
+- If a document is empty, irrelevant, duplicated, off-topic, or too generic, write a short English note (<= 20 words). Otherwise "".
+
+[Output Instructions]
+- `results` MUST contain exactly one entry per document, in the SAME ORDER as given.
+- Score values MUST be one of: 0.00, 0.25, 0.50, 0.75, 1.00.
+"""),
+        ("human", """
+[Inputs]
+- Question Summary: {q_en_transformed}
+- RAG Query: {rag_query}
+
+[Documents]
+{docs_block}
+"""),
+    ])
+    # json_object + format_instructions 대신 json_schema(strict): 스키마는
+    # 서버가 강제하므로 프롬프트의 스키마 문단을 통째로 제거해도 안전합니다.
+    llm = get_chat_llm(_eval_model(), temperature=0.0).bind(
+        response_format=_response_format_for(BatchDocEvaluationResult)
+    )
+    # 메시지까지만 반환: 호출부가 model_validate_json으로 한 번에 파싱
+    return prompt | llm
+
+@functools.lru_cache(maxsize=1)
+def _get_direct_eval_client():
+    """(TEAM2_DIRECT_EVAL) OpenAI SDK 클라이언트를 1회만 생성해 재사용합니다."""
+    from openai import OpenAI
+    from utility_tools import _get_http_client
+    try:
+        return OpenAI(http_client=_get_http_client())
+    except Exception:
+        return OpenAI()
+
+
+def _direct_doc_eval(prompt, inputs: Dict[str, Any]) -> "DocEvaluationResult":
+    """
+    (TEAM2_DIRECT_EVAL=true) 문서 판정을 LangChain 체인 없이 OpenAI SDK로
+    직접 호출합니다. 프롬프트는 기존 템플릿을 렌더링해 그대로 쓰므로 내용은
+    동일하고, 러너블 디스패치/콜백 매니저의 호출당 오버헤드만 사라집니다.
+    """
+    messages = [
+        {"role": "system" if m.type == "system" else "user", "content": m.content}
+        for m in prompt.format_messages(**inputs)
+    ]
+    resp = _get_direct_eval_client().chat.completions.create(
+        model=_eval_model(),
+        temperature=0.0,
+        max_tokens=eval_max_tokens,
+        seed=getattr(config, "LLM_SEED", None),
+        response_format=_response_format_for(DocEvaluationResult),
+        messages=messages,
+    )
+    return _EVAL_ADAPTER.validate_json(resp.choices[0].message.content)
+
+
+def _embed_prefilter_scores(previews: List[str], q_en_transformed: str):
+    """
+    (TEAM2_EMBED_PREFILTER) 질문과 각 미리보기의 임베딩 코사인 유사도를
+    배치 1회로 계산합니다. 검색에 쓰는 것과 같은 임베딩 모델을 재사용하며,
+    양끝 밴드(명백한 합/불합)는 판정 LLM을 건너뛰는 캐스케이드의 1단계입니다.
+    """
+    from utility_tools import _get_embeddings
+    emb = _get_embeddings()
+    q = np.asarray(emb.embed_query(q_en_transformed), dtype=np.float32)
+    q /= (np.linalg.norm(q) + 1e-12)
+    vecs = np.asarray(emb.embed_documents(list(previews)), dtype=np.float32)
+    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+    return vecs @ q
+
+
+# 휴리스틱 사전 판정용: 쿼리에서 핵심 토큰(3자 이상 영문/한글/숫자)을 추출
+_QUERY_TOKEN_RE = re.compile(r"[A-Za-z가-힣0-9]{3,}")
+
+
+def _heuristic_doc_eval(preview: str, rag_query: str):
+    """
+    명백한 합/불합 문서를 LLM 없이 결정적 규칙으로 판정합니다.
+    - 내용이 200자 미만 → 즉시 탈락 (판정 LLM도 항상 탈락시키는 입력)
+    - 800자 초과 + 쿼리 핵심 토큰의 80% 이상 포함 → 즉시 통과
+    애매하면 None을 반환해 기존 LLM 판정 경로로 넘깁니다.
+    """
+    text = preview.strip()
+    if len(text) < 200:
+        return {"semantic_relevance": 0.0, "is_detailed": 0.0,
+                "error_message": "document too short (heuristic reject)"}
+    if len(text) > 800:
+        tokens = _QUERY_TOKEN_RE.findall(rag_query.lower())
+        if tokens:
+            lower = text.lower()
+            hit = sum(1 for t in tokens if t in lower)
+            if hit >= max(2, int(len(tokens) * 0.8)):
+                return {"semantic_relevance": 0.75, "is_detailed": 0.75,
+                        "error_message": ""}
+    return None
+
+
+def _dedupe_docs_for_eval(docs_to_evaluate: List[tuple], seen: set = None) -> List[tuple]:
+    """
+    내용 앞부분(256자) 해시가 같은 중복 문서를 제거합니다.
+    같은 청크가 RAG/웹 양쪽이나 재시도 라운드에 겹쳐 들어오면 판정 호출과
+    프롬프트 토큰만 낭비되므로, 첫 등장만 남깁니다.
+    (seen을 넘기면 라운드 간 누적 — 호출자가 상태에 persist)
+    """
+    if seen is None:
+        seen = set()
+    out: List[tuple] = []
+    for src, doc in docs_to_evaluate:
+        sig = EvalResultCache.make_key((getattr(doc, "page_content", "") or "")[:256])
+        if sig in seen:
+            continue
+        seen.add(sig)
+        out.append((src, doc))
+    if len(out) < len(docs_to_evaluate):
+        log(f"🧹 중복 문서 {len(docs_to_evaluate) - len(out)}개 제거 (판정 생략)")
+    return out
+
+
+# Team1 평가자가 pass 시 best_rag_query/q_en_transformed를 상태 최상위 키로
+# 항상 기록하므로, 정상 경로는 O(1) 상태 읽기로 끝납니다. 메시지 이력 역탐색은
+# 구형 체크포인트 재개 등 키가 빈 경우를 위한 레거시 경로로만 남깁니다.
 def _get_query_from_history(state: AgentState) -> str:
     brq = state.get("best_rag_query")
     if brq:
         return brq
+    log("⚠️ best_rag_query 상태 키가 비어 있음 — 메시지 이력 역탐색(레거시 경로)")
     for msg in reversed(state['messages']):
         if isinstance(msg, ToolMessage) and msg.name == "team1_evaluator":
             return msg.additional_kwargs.get("best_rag_query", "")
@@ -39,6 +500,7 @@ def _get_refined_question_from_history(state: AgentState) -> str:
     q = state.get("q_en_transformed")
     if q:
         return q
+    log("⚠️ q_en_transformed 상태 키가 비어 있음 — 메시지 이력 역탐색(레거시 경로)")
     for msg in reversed(state['messages']):
         if isinstance(msg, ToolMessage) and msg.name == "team1_evaluator":
             return msg.additional_kwargs.get("q_en_transformed", "")
@@ -46,57 +508,141 @@ def _get_refined_question_from_history(state: AgentState) -> str:
 
 # --- Node 1: RAG 검색 ---
 def rag_search(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 2 (RAG 검색) 실행 ---")
+    log("--- AGENT: Team 2 (RAG 검색) 실행 ---")
     rag_query = _get_query_from_history(state)
     if not rag_query:
-        return {"messages": [ToolMessage(content="fail: RAG 쿼리를 찾을 수 없습니다.", name="rag_search", tool_call_id=str(uuid.uuid4()))]}
+        return {"messages": [ToolMessage(content="fail: RAG 쿼리를 찾을 수 없습니다.", name="rag_search", tool_call_id=next_tool_call_id())]}
 
     try:
-        rag_docs = vector_store_rag_search.func(rag_query, top_k=rag_search_num, rerank_k=rag_search_num)
-        return {
+        rag_docs = _do_rag_search(rag_query, top_k=rag_search_num, rerank_k=rag_search_num)
+        out: Dict[str, Any] = {
             "messages": [
                 ToolMessage(
                     content=format_docs(rag_docs),
                     name="rag_search_result",
-                    tool_call_id=str(uuid.uuid4()),
+                    tool_call_id=next_tool_call_id(),
                     additional_kwargs={"source_docs": rag_docs}
                 )
             ],
-
-            "rag_docs": [],
-            "web_docs": [],
         }
+        # 새 Team1 쿼리일 때만 누적 버킷을 비웁니다. 같은 쿼리의 재시도/웹 폴백
+        # 라운드면 이전 라운드 채택 문서를 유지해 재판정 호출을 통째로 아낍니다.
+        if state.get("team2_accum_query") != rag_query:
+            out["rag_docs"] = []
+            out["web_docs"] = []
+            out["team2_seen_hashes"] = []
+            out["team2_accum_query"] = rag_query
+        return out
     except Exception as e:
-        print(f"❌ Team 2 (RAG 검색) 도구 실행 오류: {e}")
-        return {"messages": [ToolMessage(content=f"fail: RAG 검색 오류 - {e}", name="rag_search", tool_call_id=str(uuid.uuid4()))]}
+        log(f"❌ Team 2 (RAG 검색) 도구 실행 오류: {e}")
+        return {"messages": [ToolMessage(content=f"fail: RAG 검색 오류 - {e}", name="rag_search", tool_call_id=next_tool_call_id())]}
 
 # --- Node 2: 웹 검색 ---
 def web_search(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 2 (웹 검색) 실행 ---")
+    log("--- AGENT: Team 2 (웹 검색) 실행 ---")
     q_en_transformed = state.get("q_en_transformed", "")
     try:
-        web_docs = deep_research_web_search.func(q_en_transformed, max_results=web_search_num)
+        web_docs = _do_web_search(q_en_transformed, max_results=web_search_num)
         return {
             "messages": [
                 ToolMessage(
                     content=format_docs(web_docs),
                     name="web_search_result",
-                    tool_call_id=str(uuid.uuid4()),
+                    tool_call_id=next_tool_call_id(),
                     additional_kwargs={"source_docs": web_docs}
                 )
             ]
         }
     except Exception as e:
-        print(f"❌ Team 2 (웹 검색) 도구 실행 오류: {e}")
-        return {"messages": [ToolMessage(content=f"fail: 웹 검색 오류 - {e}", name="web_search", tool_call_id=str(uuid.uuid4()))]}
+        log(f"❌ Team 2 (웹 검색) 도구 실행 오류: {e}")
+        return {"messages": [ToolMessage(content=f"fail: 웹 검색 오류 - {e}", name="web_search", tool_call_id=next_tool_call_id())]}
+
+# --- Node 2.5: 병렬 검색 (RAG + 웹 동시 실행) ---
+def parallel_search(state: AgentState) -> Dict[str, Any]:
+    """
+    RAG 검색과 웹 검색을 동시에 실행합니다.
+    두 검색 모두 독립적인 I/O 호출이므로 병렬화하면 총 지연 시간이
+    t_rag + t_web 대신 max(t_rag, t_web)으로 줄어듭니다.
+    """
+    log("--- AGENT: Team 2 (병렬 검색) 실행 ---")
+    rag_query = _get_query_from_history(state)
+    if not rag_query:
+        return {"messages": [ToolMessage(content="fail: RAG 쿼리를 찾을 수 없습니다.", name="parallel_search", tool_call_id=next_tool_call_id())]}
+    q_en_transformed = _get_refined_question_from_history(state) or rag_query
+
+    async def _run_both():
+        return await asyncio.gather(
+            asyncio.to_thread(_do_rag_search, rag_query, rag_search_num, rag_search_num),
+            asyncio.to_thread(_do_web_search, q_en_transformed, web_search_num),
+            return_exceptions=True,
+        )
+
+    try:
+        rag_docs, web_docs = asyncio.run(_run_both())
+        if isinstance(rag_docs, Exception):
+            log(f"⚠️ Team 2 (병렬 검색) RAG 오류: {rag_docs}")
+            rag_docs = []
+        if isinstance(web_docs, Exception):
+            log(f"⚠️ Team 2 (병렬 검색) 웹 오류: {web_docs}")
+            web_docs = []
+        out: Dict[str, Any] = {
+            "messages": [
+                ToolMessage(
+                    content=format_docs(rag_docs),
+                    name="rag_search_result",
+                    tool_call_id=next_tool_call_id(),
+                    additional_kwargs={"source_docs": rag_docs}
+                ),
+                ToolMessage(
+                    content=format_docs(web_docs),
+                    name="web_search_result",
+                    tool_call_id=next_tool_call_id(),
+                    additional_kwargs={"source_docs": web_docs}
+                ),
+            ],
+        }
+        # rag_search와 동일: 쿼리가 바뀐 경우에만 누적 버킷을 초기화합니다.
+        if state.get("team2_accum_query") != rag_query:
+            out["rag_docs"] = []
+            out["web_docs"] = []
+            out["team2_seen_hashes"] = []
+            out["team2_accum_query"] = rag_query
+        return out
+    except Exception as e:
+        log(f"❌ Team 2 (병렬 검색) 실행 오류: {e}")
+        return {"messages": [ToolMessage(content=f"fail: 병렬 검색 오류 - {e}", name="parallel_search", tool_call_id=next_tool_call_id())]}
 
 # --- Node 3: 문서 평가(문서별 스코어링 & 소스별 누적) ---
 def evaluate_documents(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 2 (문서 평가) 실행 ---")
+    log("--- AGENT: Team 2 (문서 평가) 실행 ---")
+
+    # 직전 검색 결과 메시지들을 수집합니다.
+    # (병렬 검색 시 rag/web 결과 메시지가 연달아 쌓이므로 둘 다 소비)
+    search_results = []  # (source, docs)
+    for msg in reversed(state['messages']):
+        if isinstance(msg, ToolMessage) and msg.name in ("rag_search_result", "web_search_result"):
+            src = "web" if msg.name == "web_search_result" else "rag"
+            search_results.append((src, msg.additional_kwargs.get("source_docs", [])))
+        else:
+            break
+    search_results.reverse()
 
-    last_message = state['messages'][-1]
-    docs_to_evaluate = last_message.additional_kwargs.get("source_docs", [])
-    source = "web" if last_message.name == "web_search_result" else "rag"
+    # 라운드 간 중복 차단: 이전 라운드에서 이미 판정한 문서 해시를 상태에서
+    # 이어받아, 재시도/웹 폴백에 같은 청크가 또 오면 판정 자체를 건너뜁니다.
+    seen_hashes = set(state.get("team2_seen_hashes", []))
+    docs_to_evaluate = _dedupe_docs_for_eval(
+        [(src, d) for src, docs in search_results for d in docs],
+        seen_hashes,
+    )
+    # 리랭커 점수가 있는 문서를 점수 내림차순으로 먼저 평가합니다.
+    # 합격 가능성이 높은 문서가 앞에 오면 목표 충족 시의 조기 종료가 더
+    # 일찍 걸려 남은 판정 호출을 아낍니다. (점수 없는 문서는 원래 순서로 뒤에)
+    docs_to_evaluate.sort(
+        key=lambda sd: float((getattr(sd[1], "metadata", None) or {}).get("rerank_score", float("-inf"))),
+        reverse=True,
+    )
+    # 웹 결과까지 이미 받았으면 재시도 결정은 웹 기준으로 내립니다.
+    source = "web" if any(src == "web" for src, _ in search_results) else "rag"
 
     rag_acc = list(state.get("rag_docs", []))
     web_acc = list(state.get("web_docs", []))
@@ -113,7 +659,7 @@ def evaluate_documents(state: AgentState) -> Dict[str, Any]:
                 ToolMessage(
                     content=decision,
                     name="team2_evaluator",
-                    tool_call_id=str(uuid.uuid4()),
+                    tool_call_id=next_tool_call_id(),
                     additional_kwargs={
                         "source": source,
                         "accepted_rag": len(rag_acc),
@@ -128,108 +674,202 @@ def evaluate_documents(state: AgentState) -> Dict[str, Any]:
             "rag_docs": rag_acc,
             "web_docs": web_acc,
             "team2_retries": next_retries,
+            "team2_seen_hashes": sorted(seen_hashes),
         }
 
     q_en_transformed = _get_refined_question_from_history(state)
     rag_query = _get_query_from_history(state)
 
-    parser = JsonOutputParser(p_object=DocEvaluationResult)
-    single_doc_prompt = PromptTemplate.from_template("""
-You are a strict Quality Control Supervisor evaluator.
-Your job is to carefully assess whether the given document is sufficiently relevant and detailed to help answer the user’s question.
-Follow the instructions below without deviation and return ONLY a valid JSON object matching the schema.
+    # 배치 평가(옵션): 이번 라운드의 미평가 문서들을 판정 1회 호출로 선평가.
+    # 성공 시 아래 문서별 루프는 전부 캐시에 적중하고, 실패 시 그대로 문서별 평가.
+    # 리랭커 점수 우회(옵션): 검색 시 이미 지불한 크로스 인코더 점수가 상위
+    # total_docs_required건 모두 임계치 이상이면, 이번 라운드는 판정 LLM 없이
+    # 그대로 통과시킵니다. (점수가 없는 문서는 -inf로 취급되어 우회 불가)
+    bypass_accepted = None
+    _bypass_thr = getattr(config, "RERANK_BYPASS_THRESHOLD", 0)
+    if _bypass_thr and len(docs_to_evaluate) >= total_docs_required:
+        top = docs_to_evaluate[:total_docs_required]
+        if all(
+            float((getattr(d, "metadata", None) or {}).get("rerank_score", float("-inf"))) >= _bypass_thr
+            for _, d in top
+        ):
+            log(f"⚡ 리랭커 점수 우회: 상위 {total_docs_required}건 점수 ≥ {_bypass_thr} — 판정 LLM 생략")
+            bypass_accepted = top
+            docs_to_evaluate = []
 
-[Evaluation Guidelines]
-- Use the two scoring rubrics below independently: one for semantic_relevance and one for is_detailed.
-- Judge only based on the provided inputs. Do not invent information.
-- All contents of the document should be considered, not just part of the document.
+    # 미리보기/스니펫 문자열은 문서당 1회만 생성해 프리필 경로와 본 루프가
+    # 공유합니다. (대용량 웹 문서에서 반복 슬라이싱/해시 재계산 방지)
+    previews: List[str] = []
+    truncated_count = 0
+    for _, doc in docs_to_evaluate:
+        content = getattr(doc, "page_content", "") or ""
+        if len(content) > eval_preview_max_chars:
+            truncated_count += 1
+        previews.append(truncate_middle(content, eval_preview_max_chars))
 
-[Scoring Guide — semantic_relevance]
-Choose EXACTLY one level for how well the document matches the question’s intent and constraints (subject, entities, context).
-- 0.00 = None: completely irrelevant or empty; contradicts the question or ignores core entities/constraints.
-- 0.25 = Low: superficial keyword overlap; misses main intent or key constraints; noticeable topic drift.
-- 0.50 = Partial: addresses the main topic but misses important constraints/context; mixed or uneven relevance.
-- 0.75 = Strong: satisfies most intent/constraints with minor mismatches or small gaps.
-- 1.00 = Exact: fully aligned with the question’s entities and constraints; no topic drift.
-
-[Scoring Guide — is_detailed]
-Choose EXACTLY one level for how specific and sufficient the document is to support a reliable answer.
-- 0.00 = None: empty/generic; no actionable specifics.
-- 0.25 = Low: few specifics; vague statements; lacks steps, data, or concrete facts.
-- 0.50 = Partial: some specifics but missing key details to answer fully; incomplete coverage.
-- 0.75 = Strong: solid specifics; covers most needed details with minor gaps.
-- 1.00 = Exact: comprehensive and specific (e.g., steps, parameters, examples, citations, or numbers); fully sufficient.
-
-[Error Message]
-- If the document is empty, irrelevant, duplicated, off-topic, or too generic/outdated for the question, write a short English note (<= 20 words).
-- Otherwise, return "".
+    # 임베딩 캐스케이드(옵션): 밴드 판정용 유사도를 라운드당 배치 1회로 계산
+    embed_sims = None
+    if getattr(config, "TEAM2_EMBED_PREFILTER", False) and docs_to_evaluate:
+        try:
+            embed_sims = _embed_prefilter_scores(previews, q_en_transformed)
+        except Exception as e:
+            log(f"⚠️ Team 2 임베딩 사전 판정 실패(무시): {e}")
 
-[Inputs]
-- Question Summary: {q_en_transformed}
-- RAG Query: {rag_query}
-- Document (excerpted for evaluation): {doc_text}
+    if getattr(config, "TEAM2_EVAL_MODE", "online") == "batch":
+        # 오프라인 일괄 모드: /v1/batches로 제출하고 완료까지 대기
+        _batch_api_prefill_doc_evals(previews, q_en_transformed, rag_query)
+    elif getattr(config, "TEAM2_BATCH_EVAL", False):
+        _batch_prefill_doc_evals(previews, q_en_transformed, rag_query)
+    elif getattr(config, "TEAM2_PARALLEL_EVAL", False):
+        # 병렬 평가(옵션): 문서별 판정을 동시에 실행해 캐시를 선채웁니다.
+        _parallel_prefill_doc_evals(previews, q_en_transformed, rag_query)
 
-[Output Instructions]
-- Return ONLY a valid JSON object; no commentary, Markdown, code fences, or extra keys.
-- Keys must exactly match the schema fields.
-- Values for the two scores MUST be one of: 0.00, 0.25, 0.50, 0.75, 1.00.
-
-Output schema:
-{schema}
-""").partial(schema=parser.get_format_instructions())
-    llm = ChatOpenAI(
-        model=config.LLM_MODEL_TEAM2_EVAL,
-        temperature=0.0,
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
-    chain = single_doc_prompt | llm | parser
+    single_doc_prompt, llm, parser, chain = _get_doc_eval_chain()
 
     accepted: List[Any] = []
     rejected: List[Any] = []
 
-    for doc in docs_to_evaluate:
+    # 리랭커 점수 3분할 임계치(0이면 비활성). 전체 우회(RERANK_BYPASS_THRESHOLD)와
+    # 달리 문서 단위로 동작해, 일부만 확정되고 나머지는 LLM 판정을 받습니다.
+    _rr_accept = float(getattr(config, "RERANK_ACCEPT_THRESHOLD", 0))
+    _rr_reject = float(getattr(config, "RERANK_REJECT_THRESHOLD", 0))
+
+    for i, ((src, doc), preview) in enumerate(zip(docs_to_evaluate, previews)):
         try:
-            preview = (getattr(doc, "page_content", "") or "")[:4000]
-            result_dict = chain.invoke({"q_en_transformed": q_en_transformed, "rag_query": rag_query, "doc_text": preview})
-            r = DocEvaluationResult.model_validate(result_dict)
+            # 0) 휴리스틱 사전 판정: 명백한 경우는 캐시/LLM 모두 생략
+            result_dict = None
+            if getattr(config, "TEAM2_HEURISTIC_PREFILTER", False):
+                result_dict = _heuristic_doc_eval(preview, rag_query)
+                if result_dict is not None:
+                    log("⚡ Team 2 휴리스틱 사전 판정 (LLM 생략)")
+            # 0.3) 리랭커 점수 밴드 판정: 검색 시 이미 지불한 크로스 인코더
+            # 점수로 양끝 밴드를 즉시 확정하고, 애매한 중간 밴드만 LLM으로
+            # 보냅니다. (점수 없는 문서 — 웹 검색 결과 등 — 는 건너뜀)
+            if result_dict is None and _rr_accept:
+                rr = (getattr(doc, "metadata", None) or {}).get("rerank_score")
+                if rr is not None:
+                    rr = float(rr)
+                    if rr >= _rr_accept:
+                        log(f"⚡ Team 2 리랭커 사전 합격 (score={rr:.2f}, LLM 생략)")
+                        result_dict = {"semantic_relevance": 0.75, "is_detailed": 0.75, "error_message": ""}
+                    elif rr < _rr_reject:
+                        log(f"⚡ Team 2 리랭커 사전 탈락 (score={rr:.2f}, LLM 생략)")
+                        result_dict = {"semantic_relevance": 0.0, "is_detailed": 0.0,
+                                       "error_message": "rejected by rerank-score prefilter"}
+            # 0.5) 임베딩 밴드 판정: 양끝 밴드는 즉시 확정, 중간 밴드만 LLM으로
+            if result_dict is None and embed_sims is not None:
+                sim = float(embed_sims[i])
+                if sim >= getattr(config, "TEAM2_EMBED_ACCEPT_THRESHOLD", 0.75):
+                    log(f"⚡ Team 2 임베딩 사전 합격 (cos={sim:.2f}, LLM 생략)")
+                    result_dict = {"semantic_relevance": 0.75, "is_detailed": 0.75, "error_message": ""}
+                elif sim <= getattr(config, "TEAM2_EMBED_REJECT_THRESHOLD", 0.20):
+                    log(f"⚡ Team 2 임베딩 사전 탈락 (cos={sim:.2f}, LLM 생략)")
+                    result_dict = {"semantic_relevance": 0.0, "is_detailed": 0.0,
+                                   "error_message": "rejected by embedding prefilter"}
+            cache_key = EvalResultCache.make_key(q_en_transformed, rag_query, preview)
+            if result_dict is None:
+                result_dict = _doc_eval_cache.get(cache_key)
+            sem_text = None
+            sem_doc_hash = None
+            if result_dict is None and getattr(config, "TEAM2_SEMANTIC_CACHE", False):
+                # 질문/쿼리만 임베딩하고 문서는 해시로 정확 제한합니다.
+                # (질문 표현이 조금 달라져도 '같은 문서'에 대한 판정만 재사용)
+                sem_text = "\x1f".join((q_en_transformed, rag_query))
+                sem_doc_hash = EvalResultCache.make_key(preview)
+                try:
+                    result_dict = _get_semantic_cache().lookup(sem_text, doc_hash=sem_doc_hash)
+                    if result_dict is not None:
+                        log("♻️ Team 2 평가 시맨틱 캐시 적중 (LLM 호출 생략)")
+                except Exception as cache_err:
+                    log(f"⚠️ 시맨틱 캐시 조회 실패(무시): {cache_err}")
+            r = None
+            if result_dict is None:
+                inputs = {"q_en_transformed": q_en_transformed, "rag_query": rag_query, "doc_text": preview}
+                if config.TEAM2_STREAM_EVAL:
+                    result_dict = _stream_doc_eval(single_doc_prompt, llm, parser, inputs)
+                elif getattr(config, "TEAM2_DIRECT_EVAL", False):
+                    r = _direct_doc_eval(single_doc_prompt, inputs)
+                    result_dict = r.model_dump()
+                else:
+                    # model_validate_json: JSON 텍스트 → 모델을 한 번에 파싱
+                    # (json 파싱 + dict 검증의 2중 패스를 제거)
+                    r = _EVAL_ADAPTER.validate_json(_do_judge(chain, inputs).content)
+                    result_dict = r.model_dump()
+                _doc_eval_cache.put(cache_key, result_dict)
+                if sem_text is not None:
+                    try:
+                        _get_semantic_cache().add(sem_text, result_dict, doc_hash=sem_doc_hash)
+                    except Exception as cache_err:
+                        log(f"⚠️ 시맨틱 캐시 기록 실패(무시): {cache_err}")
+            if r is None:
+                r = _EVAL_ADAPTER.validate_python(result_dict)
             is_pass = (r.semantic_relevance >= semantic_relevance_THRESHOLD) and (r.is_detailed >= is_detailed_THRESHOLD)
             if is_pass:
-                accepted.append(doc)
+                accepted.append((src, doc))
+                # 조기 종료: 누적 합계가 이미 목표를 채웠으면 남은 문서의
+                # 판정 호출(LLM 왕복)을 건너뜁니다.
+                if len(rag_acc) + len(web_acc) + len(accepted) >= total_docs_required:
+                    log(f"🎯 문서 목표({total_docs_required}) 충족 — 남은 {len(docs_to_evaluate) - len(accepted) - len(rejected)}건 판정 생략")
+                    break
             else:
                 rejected.append({"reason": r.error_message, "snippet": preview[:300]})
         except Exception as e:
             rejected.append({"reason": f"LLM 오류: {e}", "snippet": (getattr(doc, "page_content", "") or "")[:300]})
 
-    if accepted:
-        if source == "rag":
-            rag_acc += accepted
+    if truncated_count:
+        log(f"✂️ 판정 미리보기 중간 생략: {truncated_count}/{len(docs_to_evaluate)}건 (> {eval_preview_max_chars}자 — 상류 청크 크기 튜닝 참고)")
+
+    if bypass_accepted is not None:
+        accepted = bypass_accepted
+
+    for src, doc in accepted:
+        if src == "rag":
+            rag_acc.append(doc)
         else:
-            web_acc += accepted
+            web_acc.append(doc)
 
     total = len(rag_acc) + len(web_acc)
-    print(f"📊 평가 결과: RAG 누적 {len(rag_acc)} / WEB 누적 {len(web_acc)} (합계 {total}, 목표 ≥ {total_docs_required})")
+    log(f"📊 평가 결과: RAG 누적 {len(rag_acc)} / WEB 누적 {len(web_acc)} (합계 {total}, 목표 ≥ {total_docs_required})")
 
     if total >= total_docs_required:
-        combined = rag_acc + web_acc
+        # 문서 본문은 상태(team2_docs_by_id)에만 두고, pass 메시지에는
+        # 경량 핸들(id/카운트)만 싣습니다. (본문을 메시지 채널에 3중으로
+        # 복제하지 않아 상태 직렬화/체크포인트 비용이 줄어듦)
+        docs_by_id: Dict[str, Any] = {}
+
+        def _doc_id(d) -> str:
+            meta = getattr(d, "metadata", None)
+            did = meta.get("doc_id") if meta else None
+            if not did:
+                did = EvalResultCache.make_key(getattr(d, "page_content", "") or "")
+                if meta is not None:
+                    meta["doc_id"] = did
+            docs_by_id[did] = d
+            return did
+
+        rag_ids = [_doc_id(d) for d in rag_acc]
+        web_ids = [_doc_id(d) for d in web_acc]
         return {
             "messages": [
                 ToolMessage(
                     content="pass",
                     name="team2_evaluator",
-                    tool_call_id=str(uuid.uuid4()),
+                    tool_call_id=next_tool_call_id(),
                     additional_kwargs={
                         "source": source,
                         "accepted_rag": len(rag_acc),
                         "accepted_web": len(web_acc),
-                        "rag_docs": rag_acc,
-                        "web_docs": web_acc,
-                        "retrieved_docs": combined,
+                        "rag_doc_ids": rag_ids,
+                        "web_doc_ids": web_ids,
+                        "retrieved_doc_ids": rag_ids + web_ids,
                     }
                 )
             ],
             "rag_docs": rag_acc,
             "web_docs": web_acc,
+            "team2_docs_by_id": docs_by_id,
             "team2_retries": 0,
+            "team2_seen_hashes": sorted(seen_hashes),
         }
     else:
         decision = "fallback_to_web" if source == "rag" else "retry_web"
@@ -241,7 +881,7 @@ Output schema:
                 ToolMessage(
                     content=decision,
                     name="team2_evaluator",
-                    tool_call_id=str(uuid.uuid4()),
+                    tool_call_id=next_tool_call_id(),
                     additional_kwargs={
                         "source": source,
                         "accepted_rag": len(rag_acc),
@@ -256,4 +896,70 @@ Output schema:
             "rag_docs": rag_acc,
             "web_docs": web_acc,
             "team2_retries": next_retries,
-        }
\ No newline at end of file
+            "team2_seen_hashes": sorted(seen_hashes),
+        }
+
+
+@functools.lru_cache(maxsize=1)
+def _get_doc_eval_chain():
+    """
+    단일 문서 평가용 (prompt, llm, parser, chain)을 1회만 구성해 재사용합니다.
+    호출마다 PromptTemplate 컴파일과 Pydantic 스키마 생성을 반복하지 않고,
+    LLM 클라이언트도 get_chat_llm의 메모이즈를 공유합니다.
+    """
+    # 프롬프트 캐싱: 고정 루브릭은 system 메시지(접두사)로, 문서/질문 등
+    # 호출마다 달라지는 입력은 human 메시지로 분리해 prefix 캐시 적중률을 높입니다.
+    parser = JsonOutputParser(p_object=DocEvaluationResult)
+    single_doc_prompt = ChatPromptTemplate.from_messages([
+        ("system", """
+You are a strict Quality Control Supervisor evaluator.
+Your job is to carefully assess whether the given document is sufficiently relevant and detailed to help answer the user’s question.
+Follow the instructions below without deviation and return ONLY a valid JSON object matching the schema.
+
+[Evaluation Guidelines]
+- Use the two scoring rubrics below independently: one for semantic_relevance and one for is_detailed.
+- Judge only based on the provided inputs. Do not invent information.
+- All contents of the document should be considered, not just part of the document.
+
+[Scoring Guide — semantic_relevance]
+Choose EXACTLY one level for how well the document matches the question’s intent and constraints (subject, entities, context).
+- 0.00 = None: completely irrelevant or empty; contradicts the question or ignores core entities/constraints.
+- 0.25 = Low: superficial keyword overlap; misses main intent or key constraints; noticeable topic drift.
+- 0.50 = Partial: addresses the main topic but misses important constraints/context; mixed or uneven relevance.
+- 0.75 = Strong: satisfies most intent/constraints with minor mismatches or small gaps.
+- 1.00 = Exact: fully aligned with the question’s entities and constraints; no topic drift.
+
+[Scoring Guide — is_detailed]
+Choose EXACTLY one level for how specific and sufficient the document is to support a reliable answer.
+- 0.00 = None: empty/generic; no actionable specifics.
+- 0.25 = Low: few specifics; vague statements; lacks steps, data, or concrete facts.
+- 0.50 = Partial: some specifics but missing key details to answer fully; incomplete coverage.
+- 0.75 = Strong: solid specifics; covers most needed details with minor gaps.
+- 1.00 = Exact: comprehensive and specific (e.g., steps, parameters, examples, citations, or numbers); fully sufficient.
+
+[Error Message]
+- If the document is empty, irrelevant, duplicated, off-topic, or too generic/outdated for the question, write a short English note (<= 20 words).
+- Otherwise, return "".
+
+[Output Instructions]
+- Return ONLY a valid JSON object; no commentary, Markdown, code fences, or extra keys.
+- Keys must exactly match the schema fields.
+- Values for the two scores MUST be one of: 0.00, 0.25, 0.50, 0.75, 1.00.
+"""),
+        ("human", """
+[Inputs]
+- Question Summary: {q_en_transformed}
+- RAG Query: {rag_query}
+- Document (excerpted for evaluation): {doc_text}
+"""),
+    ])
+    # json_object 대신 json_schema(strict): 스키마는 서버가 강제하므로
+    # 프롬프트의 format_instructions 토큰을 제거해도 안전합니다.
+    llm = get_chat_llm(_eval_model(), temperature=0.0, max_tokens=eval_max_tokens).bind(
+        response_format=_response_format_for(DocEvaluationResult)
+    )
+    # 체인은 메시지까지만: 호출부가 model_validate_json으로 응답 텍스트를
+    # 모델로 한 번에 파싱합니다. (parser는 스트리밍 경로에서만 사용)
+    chain = single_doc_prompt | llm
+    return single_doc_prompt, llm, parser, chain
+
@@ -1,17 +1,20 @@
 # agents/team3_agents.py
-import json
-import uuid
+import functools
 from typing import Dict, Any
 
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage, ToolMessage
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
 import config
 from state import AgentState
-from utility_tools import format_docs, create_table_image
+from agents.eval_cache import EvalResultCache
+from utility_tools import format_docs, create_table_image, get_chat_llm, json_dumps, next_tool_call_id
+
+# 답변 평가 결과 캐시: temperature=0이므로 같은 (질문, 답변, 포맷, 문서) 조합은
+# 재평가하지 않습니다. (같은 답변이 다시 평가 루프에 들어오는 경우 즉시 반환)
+_answer_eval_cache = EvalResultCache(maxsize=256)
 
 DOCS_ANSWER_PROMPT = PromptTemplate.from_template("""
 You are the Team 3 answer generator in a Multi-Agent Q&A pipeline.
@@ -155,11 +158,17 @@ def _get_context_from_history(state: AgentState) -> dict:
         context["docs"] = rag_from_state + web_from_state  # rag 먼저
 
     # 2) 메시지에서 Team2 pass의 추가정보를 조회 (백업 경로)
+    #    pass 메시지는 경량 핸들(doc_id)만 실으므로 본문은 상태의
+    #    team2_docs_by_id에서 수화(hydrate)합니다. (구형 체크포인트가 본문을
+    #    메시지에 직접 실어둔 경우를 위한 레거시 키 조회 포함)
     if not context["docs"]:
+        docs_by_id = state.get("team2_docs_by_id", {}) or {}
         for msg in reversed(state['messages']):
             if isinstance(msg, ToolMessage) and msg.name == "team2_evaluator" and msg.content == "pass":
-                rag_docs = msg.additional_kwargs.get("rag_docs", [])
-                web_docs = msg.additional_kwargs.get("web_docs", [])
+                rag_docs = [docs_by_id[i] for i in msg.additional_kwargs.get("rag_doc_ids", []) if i in docs_by_id] \
+                    or msg.additional_kwargs.get("rag_docs", [])
+                web_docs = [docs_by_id[i] for i in msg.additional_kwargs.get("web_doc_ids", []) if i in docs_by_id] \
+                    or msg.additional_kwargs.get("web_docs", [])
                 if rag_docs or web_docs:
                     context["rag_docs"] = rag_docs
                     context["web_docs"] = web_docs
@@ -237,8 +246,12 @@ Your previous answer was not satisfactory. You MUST revise your answer based on
             "answer_language": answer_language,
         }
 
-    llm = ChatOpenAI(model=config.LLM_MODEL_TEAM3_GEN, temperature=0.0)
-    chain = prompt.partial(feedback_instructions=feedback_instructions) | llm
+    # 클라이언트는 get_chat_llm이 (모델, 온도) 단위로 메모이즈해 재사용합니다.
+    llm = get_chat_llm(config.LLM_MODEL_TEAM3_GEN, temperature=0.0)
+    # 동적 값은 partial 재바인딩(템플릿 복제) 대신 invoke 입력으로 전달
+    if "feedback_instructions" in set(getattr(prompt, "input_variables", [])):
+        invoke_params["feedback_instructions"] = feedback_instructions
+    chain = prompt | llm
 
     try:
         result = chain.invoke(invoke_params)
@@ -262,43 +275,23 @@ Your previous answer was not satisfactory. You MUST revise your answer based on
         return {"messages": [AIMessage(content=final_content)]}
     except Exception as e:
         print(f"❌ Team 3 (답변 생성) 오류: {e}")
-        return {"messages": [ToolMessage(content=f"fail: Team3 Worker 오류 - {e}", name="team3_worker", tool_call_id=str(uuid.uuid4()))]}
-
-# --- Node 2: 답변 평가 (Evaluator) ---
-def evaluate_answer(state: AgentState) -> Dict[str, Any]:
-    print("--- AGENT: Team 3 (답변 평가) 실행 ---")
-    generated_answer_msg = state['messages'][-1]
-    if not isinstance(generated_answer_msg, AIMessage):
-        return {"messages": [ToolMessage(content="fail: 평가할 답변을 찾을 수 없습니다.", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]}
-    
-    current_retries = state.get("team3_retries", 0)
-    
-    answer = generated_answer_msg.content
-    context = _get_context_from_history(state)
-    question = context["q_en_transformed"]
-    output_format = context["output_format"]
-    
-    if not all([question, output_format, answer]):
-        return {"messages": [ToolMessage(content="fail: 평가에 필요한 정보 부족", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]}
-    
-    parser = JsonOutputParser(p_object=AnswerEvaluationResult)
+        return {"messages": [ToolMessage(content=f"fail: Team3 Worker 오류 - {e}", name="team3_worker", tool_call_id=next_tool_call_id())]}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_answer_eval_chain():
+    """
+    답변 평가 체인을 1회만 구성해 재사용합니다.
+    호출마다 PromptTemplate 컴파일과 Pydantic 스키마 생성을 반복하지 않고,
+    LLM 클라이언트도 get_chat_llm의 메모이즈를 공유합니다.
+    """
+    # PydanticOutputParser는 검증된 모델을 바로 반환하므로,
+    # dict로 받은 뒤 다시 model_validate 하는 중간 단계가 없습니다.
+    parser = PydanticOutputParser(pydantic_object=AnswerEvaluationResult)
     prompt = PromptTemplate.from_template("""
 You are the Team 3 Supervisor evaluator. Judge the final answer against the requested format,
 the refined question, AND the provided documents.
 
-Inputs:
-[Refined question]
-{q_en_transformed}
-
-[Output format]  # ["type", "language"]
-{output_format}
-
-[Generated answer]
-{generated_answer}
-
-[Retrieved docs]
-{retrieved_docs}
-
 Scoring policy (deterministic):
 - For EACH criterion, choose ONE value from {{0, 0.25, 0.50, 0.75, 1.00}}.
 - Use the anchor descriptions below. If borderline, ROUND DOWN to the nearest anchor.
@@ -332,22 +325,73 @@ Criteria & anchors:
 
 Return JSON ONLY with:
 {schema}
+
+Inputs:
+[Refined question]
+{q_en_transformed}
+
+[Output format]  # ["type", "language"]
+{output_format}
+
+[Generated answer]
+{generated_answer}
+
+[Retrieved docs]
+{retrieved_docs}
 """).partial(schema=parser.get_format_instructions())
-    llm = ChatOpenAI(
-        model=config.LLM_MODEL_TEAM3_EVAL,
-        temperature=0.0,
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
+    # 동적 입력(질문/포맷/답변/문서)은 프롬프트 끝: OpenAI 프롬프트 캐시가
+    # 정적 루브릭+스키마 접두사를 반복 호출에서 재사용할 수 있게 합니다.
+    llm = get_chat_llm(config.LLM_MODEL_TEAM3_EVAL, temperature=0.0, json_mode=True)
     chain = prompt | llm | parser
+    return chain
+
+
+# --- Node 2: 답변 평가 (Evaluator) ---
+def evaluate_answer(state: AgentState) -> Dict[str, Any]:
+    print("--- AGENT: Team 3 (답변 평가) 실행 ---")
+    generated_answer_msg = state['messages'][-1]
+    if not isinstance(generated_answer_msg, AIMessage):
+        return {"messages": [ToolMessage(content="fail: 평가할 답변을 찾을 수 없습니다.", name="team3_evaluator", tool_call_id=next_tool_call_id())]}
+    
+    current_retries = state.get("team3_retries", 0)
+    
+    answer = generated_answer_msg.content
+    context = _get_context_from_history(state)
+    question = context["q_en_transformed"]
+    output_format = context["output_format"]
+    
+    if not all([question, output_format, answer]):
+        return {"messages": [ToolMessage(content="fail: 평가에 필요한 정보 부족", name="team3_evaluator", tool_call_id=next_tool_call_id())]}
+
+    # 재시도인데 답변이 직전과 완전히 동일하면, 같은 판정이 반복될 뿐이므로
+    # 재판정(LLM)도 추가 재시도도 하지 않고 즉시 종료합니다.
+    answer_hash = EvalResultCache.make_key(answer)
+    if current_retries > 0 and state.get("team3_last_answer_hash") == answer_hash:
+        print("⏭️ Team 3: 재생성 답변이 직전 시도와 동일 — 재판정 생략 후 종료")
+        return {
+            "team3_retries": current_retries + 1,
+            "team3_last_answer_hash": answer_hash,
+            "messages": [ToolMessage(content="fail: 재시도에도 동일한 답변이 생성되어 개선 여지가 없습니다.", name="team3_evaluator", tool_call_id=next_tool_call_id())]
+        }
+    
+    chain = _get_answer_eval_chain()
 
     try:
-        result_dict = chain.invoke({
-            "q_en_transformed": question,
-            "output_format": json.dumps(output_format, ensure_ascii=False),
-            "generated_answer": answer,
-            "retrieved_docs": format_docs(context["docs"])
-        })
-        result = AnswerEvaluationResult.model_validate(result_dict)
+        docs_preview = format_docs(context["docs"])
+        output_format_json = json_dumps(output_format)
+        cache_key = EvalResultCache.make_key(question, answer, output_format_json, docs_preview)
+        result_dict = _answer_eval_cache.get(cache_key)
+        if result_dict is None:
+            result = chain.invoke({
+                "q_en_transformed": question,
+                "output_format": output_format_json,
+                "generated_answer": answer,
+                "retrieved_docs": docs_preview
+            })
+            _answer_eval_cache.put(cache_key, result.model_dump())
+        else:
+            print("♻️ Team 3 평가 캐시 적중 (LLM 호출 생략)")
+            result = AnswerEvaluationResult.model_validate(result_dict)
 
         is_simple = state.get("is_simple_query", "No")
 
@@ -361,7 +405,8 @@ Return JSON ONLY with:
         if passed:
             return {
                 "team3_retries": 0,
-                "messages": [ToolMessage(content="pass", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]
+                "team3_last_answer_hash": answer_hash,
+                "messages": [ToolMessage(content="pass", name="team3_evaluator", tool_call_id=next_tool_call_id())]
                 }
         else:
             if current_retries < config.MAX_RETRIES_TEAM3:
@@ -369,13 +414,15 @@ Return JSON ONLY with:
                 err = result.error_message or "답변 품질 미달 (Answer quality is insufficient)"
                 return {
                     "team3_retries": current_retries + 1,
-                    "messages": [ToolMessage(content=f"retry: {err}", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]
+                    "team3_last_answer_hash": answer_hash,
+                    "messages": [ToolMessage(content=f"retry: {err}", name="team3_evaluator", tool_call_id=next_tool_call_id())]
                     }
             else:
                 print(f"❌ Team 3 최종 실패 (재시도 {config.MAX_RETRIES_TEAM3}회 초과).")
                 return {
                     "team3_retries": current_retries + 1,
-                    "messages": [ToolMessage(content="fail: 답변 품질 미달", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]
+                    "team3_last_answer_hash": answer_hash,
+                    "messages": [ToolMessage(content="fail: 답변 품질 미달", name="team3_evaluator", tool_call_id=next_tool_call_id())]
                     }
 
     except Exception as e:
@@ -383,10 +430,10 @@ Return JSON ONLY with:
         if current_retries < config.MAX_RETRIES_TEAM3:
             return {
                 "team3_retries": current_retries + 1,
-                "messages": [ToolMessage(content="retry", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]
+                "messages": [ToolMessage(content="retry", name="team3_evaluator", tool_call_id=next_tool_call_id())]
                 }
         else:
             return {
                 "team3_retries": current_retries + 1,
-                "messages": [ToolMessage(content=f"fail: Team3 Evaluator 오류 - {e}", name="team3_evaluator", tool_call_id=str(uuid.uuid4()))]
+                "messages": [ToolMessage(content=f"fail: Team3 Evaluator 오류 - {e}", name="team3_evaluator", tool_call_id=next_tool_call_id())]
                 }
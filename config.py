@@ -11,6 +11,10 @@ load_dotenv()
 # -----------------------------
 LLM_MODEL_TEAM1: str = "gpt-4.1"
 LLM_MODEL_TEAM2_EVAL: str = "gpt-4.1"
+# 문서 판정 전용 경량 모델(옵션). 판정은 점수 2개를 내는 구조화 분류라
+# 대형 모델이 필요 없습니다. 지정 시 Team2 판정 호출만 이 모델을 쓰고,
+# 비우면 LLM_MODEL_TEAM2_EVAL을 그대로 사용합니다.
+LLM_MODEL_TEAM2_EVAL_FAST: str = os.getenv("LLM_MODEL_TEAM2_EVAL_FAST", "")
 LLM_MODEL_TEAM3_GEN: str = "gpt-4.1"
 LLM_MODEL_TEAM3_EVAL: str = "gpt-4.1"
 LLM_MODEL_SUPER_ROUTER: str = "gpt-4.1"
@@ -19,6 +23,15 @@ LLM_MODEL_WEB: str = "gpt-4.1"
 # Team3 생성 파라미터
 TEAM3_TEMPERATURE: float = 0
 
+# LLM 호출 재현성: temperature=0에 더해 고정 시드를 전달합니다.
+# (서버측 프롬프트 캐시/로컬 결과 캐시의 적중률과 테스트 재현성 향상)
+LLM_SEED: int = int(os.getenv("LLM_SEED", "42"))
+
+# LLM 응답 디스크 캐시(SQLite) 경로. temperature=0 호출은 결정적이므로
+# 같은 (모델, 프롬프트) 조합은 API를 건너뛰고 저장된 응답을 재사용합니다.
+# (개발/테스트 반복 시 비용·지연 절감) 비우면 비활성.
+LLM_SQLITE_CACHE_PATH: str = os.getenv("LLM_SQLITE_CACHE_PATH", "")
+
 # -----------------------------
 # 벡터 스토어 / 임베딩
 # -----------------------------
@@ -28,20 +41,161 @@ VECTOR_STORE_PATH: str = "vector_store/"
 VECTOR_DB_PATH: str = VECTOR_STORE_PATH
 
 # OpenAI 임베딩 모델(다국어)
-OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-large"
-# dimensions=None 이면 기본(3072). 1024/256 등으로 줄이면 인덱스/비용 절감
-OPENAI_EMBEDDING_DIMENSIONS: Optional[int] = None
+OPENAI_EMBEDDING_MODEL: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+# dimensions=None 이면 기본(3072). 1024/256 등으로 줄이면 인덱스 메모리/검색 시간/비용 절감.
+# 환경변수로 재정의 가능 — 값을 바꾸면 기존 인덱스와 차원이 달라지므로 재인덱싱 필요.
+_dims_env = os.getenv("OPENAI_EMBEDDING_DIMENSIONS")
+OPENAI_EMBEDDING_DIMENSIONS: Optional[int] = int(_dims_env) if _dims_env else None
 
 # 청크 분할
 CHUNK_SIZE: int = 1000
 CHUNK_OVERLAP: int = 150
 
+# 임베딩 API 호출 배치 크기 (ingest 시 텍스트를 묶어서 전송)
+EMBED_BATCH_SIZE: int = 128
+
 # 검색 파라미터
 TOP_K_PER_QUERY: int = 5
 
+# Team2 검색 병렬화: RAG/웹 검색을 동시에 실행해 지연 시간을 줄입니다.
+# (웹 검색 호출이 추가로 발생하므로 기본은 비활성)
+TEAM2_PARALLEL_SEARCH: bool = os.getenv("TEAM2_PARALLEL_SEARCH", "false").lower() == "true"
+
+# 문서 평가 JSON을 스트리밍으로 받아, 점수 필드가 확정되는 즉시 조기 종료합니다.
+# (탈락 판정 시 error_message 꼬리 토큰을 기다리지 않아 재시도 경로가 빨라짐)
+TEAM2_STREAM_EVAL: bool = os.getenv("TEAM2_STREAM_EVAL", "false").lower() == "true"
+
+# 의미 기반 평가 캐시: 정확 일치가 실패해도, (질문, 쿼리, 문서) 텍스트의
+# 임베딩 코사인 유사도가 임계치 이상인 과거 판정을 재사용합니다.
+# 임베딩 1회 비용이 판정 LLM 1회보다 훨씬 낮아 근사 재사용이 이득입니다.
+TEAM2_SEMANTIC_CACHE: bool = os.getenv("TEAM2_SEMANTIC_CACHE", "false").lower() == "true"
+
+# 휴리스틱 사전 판정: 명백히 나쁜 문서(너무 짧음)와 명백히 좋은 문서
+# (쿼리 핵심 토큰 대부분 포함 + 충분한 길이)는 LLM 판정 없이 결정합니다.
+# 애매한 문서만 판정 LLM으로 넘어갑니다.
+TEAM2_HEURISTIC_PREFILTER: bool = os.getenv("TEAM2_HEURISTIC_PREFILTER", "false").lower() == "true"
+
+# 임베딩 캐스케이드 사전 판정: 질문-문서 임베딩 코사인이 양끝 밴드에 있으면
+# (명백한 합격/탈락) 판정 LLM을 건너뛰고, 애매한 중간 밴드만 LLM으로 보냅니다.
+# 임베딩 배치 1회가 판정 호출 여러 번보다 훨씬 싸서 대부분의 문서가 걸러집니다.
+TEAM2_EMBED_PREFILTER: bool = os.getenv("TEAM2_EMBED_PREFILTER", "false").lower() == "true"
+TEAM2_EMBED_ACCEPT_THRESHOLD: float = float(os.getenv("TEAM2_EMBED_ACCEPT_THRESHOLD", "0.75"))
+TEAM2_EMBED_REJECT_THRESHOLD: float = float(os.getenv("TEAM2_EMBED_REJECT_THRESHOLD", "0.20"))
+
+# 배치 평가: 한 라운드의 후보 문서 전체를 판정 LLM 한 번의 호출로 평가합니다.
+# (문서별 호출 대비 토큰/지연 절감. 결과 배열 길이가 어긋나면 문서별 경로로 폴백)
+TEAM2_BATCH_EVAL: bool = os.getenv("TEAM2_BATCH_EVAL", "false").lower() == "true"
+
+# 병렬 평가: 문서별 판정 호출을 asyncio로 동시에 실행합니다. 루브릭을 문서별로
+# 온전히 유지하면서 벽시계 시간이 N×RTT에서 ~1×RTT로 줄어듭니다.
+# (배치 평가가 켜져 있으면 배치가 우선. RPM/TPM 한도 보호용 동시성 상한 포함)
+TEAM2_PARALLEL_EVAL: bool = os.getenv("TEAM2_PARALLEL_EVAL", "false").lower() == "true"
+MAX_CONCURRENCY_TEAM2_EVAL: int = int(os.getenv("MAX_CONCURRENCY_TEAM2_EVAL", "8"))
+
+# 직접 호출 평가: 문서 판정을 LangChain 체인 대신 OpenAI SDK로 직접 호출합니다.
+# (러너블 디스패치/콜백 매니저의 호출당 오버헤드 제거. 프롬프트는 기존 템플릿을
+# 그대로 렌더링해 쓰므로 내용은 동일. 스트리밍/로컬 LLM 캐시 경로와는 무관하게
+# 동작해야 하므로 기본은 비활성)
+TEAM2_DIRECT_EVAL: bool = os.getenv("TEAM2_DIRECT_EVAL", "false").lower() == "true"
+
+# 평가 실행 모드: "online"(대화식 Chat Completions, 기본) | "batch"(/v1/batches).
+# batch는 토큰 비용이 50% 저렴하지만 완료까지 최대 24시간이 걸릴 수 있어
+# 재생 로그·야간 스윕 같은 비대화식 일괄 평가 전용입니다.
+TEAM2_EVAL_MODE: str = os.getenv("TEAM2_EVAL_MODE", "online")
+# batch 모드 폴링 간격(초)
+TEAM2_EVAL_BATCH_POLL_SECONDS: float = float(os.getenv("TEAM2_EVAL_BATCH_POLL_SECONDS", "30"))
+SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL: float = 3600.0  # 초
+SEMANTIC_CACHE_EMBED_MODEL: str = "text-embedding-3-small"
+# 시맨틱 캐시 영속화 경로(JSON-lines). 비우면 프로세스 내 캐시만 사용.
+# 지정하면 판정 결과가 임베딩과 함께 저장되고 다음 실행 시 웜업됩니다.
+SEMANTIC_CACHE_PERSIST_PATH: str = os.getenv("SEMANTIC_CACHE_PERSIST_PATH", "")
+
+# IVF-PQ 양자화 인덱스(옵션): 인덱싱 시 코퍼스가 임계치 이상이면 FlatIP를
+# IVFPQ로 변환해 저장합니다. 메모리 4~32배 절감 + 검색이 서브리니어해지지만
+# 근사 검색이므로 소규모 코퍼스(전수 스캔도 <1ms)에는 이득이 없어 기본 비활성.
+FAISS_USE_IVFPQ: bool = os.getenv("FAISS_USE_IVFPQ", "false").lower() == "true"
+FAISS_IVFPQ_MIN_VECTORS: int = int(os.getenv("FAISS_IVFPQ_MIN_VECTORS", "20000"))
+# 검색 시 조사할 클러스터 수 (재현율↔지연 트레이드오프)
+FAISS_IVF_NPROBE: int = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+
 # (선택) 리랭커 사용: utility_tools에서 참고
 USE_RERANKER: bool = False
 RERANKER_MODEL_NAME: str = "BAAI/bge-reranker-v2-m3"
+# 리랭커 양자화: GPU면 bf16 가중치, CPU면 동적 int8(Linear만).
+# 크로스 인코더는 양자화 정확도 손실이 미미한 반면 대역폭은 절반이 됩니다.
+# 점수 회귀 비교(FP32 기준선)가 필요할 때는 꺼두세요.
+RERANKER_QUANTIZE: bool = os.getenv("RERANKER_QUANTIZE", "false").lower() == "true"
+# 리랭커 forward 백엔드: "torch"(기본) | "onnx". onnx는 optimum.onnxruntime로
+# 모델을 export해 ORT 그래프로 실행합니다(동일 재현율에 CPU에서 수 배 빠름).
+# optimum 미설치나 export 실패 시 자동으로 torch 경로로 폴백합니다.
+RERANKER_BACKEND: str = os.getenv("RERANKER_BACKEND", "torch")
+# 리랭커 점수 우회: 검색 시 이미 지불한 크로스 인코더 점수가 라운드의 상위
+# total_docs_required개 모두 임계치 이상이면 판정 LLM을 통째로 건너뜁니다.
+# 임계치는 판정 LLM의 합격률에 맞춰 오프라인 보정 필요. 0이면 비활성.
+RERANK_BYPASS_THRESHOLD: float = float(os.getenv("RERANK_BYPASS_THRESHOLD", "0"))
+# 리랭커 점수 3분할(문서 단위): accept 이상은 즉시 합격, reject 미만은 즉시
+# 탈락, 그 사이 중간 밴드만 판정 LLM으로 보냅니다. 전체 우회와 달리 라운드
+# 일부만 확정돼도 동작합니다. 임계치는 판정 LLM 결과와 오프라인 보정 필요.
+# 0이면 비활성. (점수가 없는 웹 문서 등은 항상 LLM 판정)
+RERANK_ACCEPT_THRESHOLD: float = float(os.getenv("RERANK_ACCEPT_THRESHOLD", "0"))
+RERANK_REJECT_THRESHOLD: float = float(os.getenv("RERANK_REJECT_THRESHOLD", "0"))
+
+# -----------------------------
+# 라우팅
+# -----------------------------
+# 매니저 라우팅을 LLM에게 맡길지 여부 (A/B 비교용).
+# False면 결정적 규칙으로 라우팅하고, 규칙으로 판단 불가한 경우에만 LLM 폴백.
+USE_LLM_ROUTER: bool = os.getenv("USE_LLM_ROUTER", "false").lower() == "true"
+
+# 라우터 백엔드 선택: "rules"(결정적 분기, 기본) | "llm"(항상 LLM 라우팅).
+# 라우팅은 4지선다 분류 문제라 경량 분류기 백엔드도 끼울 수 있도록
+# 디스패치를 문자열 키로 열어둡니다. (학습된 분류기가 없어 현재는 두 가지만 지원)
+ROUTER_BACKEND: str = os.getenv("ROUTER_BACKEND", "llm" if USE_LLM_ROUTER else "rules")
+
+# 노드 융합 라우팅: 팀 평가자가 pass한 전진 경로는 매니저 노드를 거치지 않고
+# 다음 팀으로 직행합니다. (피드백/루프 카운트/재시도 초기화가 필요한 경우는
+# 여전히 매니저를 경유) LLM 라우팅 백엔드에서는 무시됩니다.
+SUPER_FUSED_ROUTING: bool = os.getenv("SUPER_FUSED_ROUTING", "true").lower() == "true"
+
+# Team1 의미 기반 질문 캐시: user_input 임베딩 코사인 유사도가 임계치 이상인
+# 과거 질문의 분석 결과(재작성/쿼리/포맷)를 재사용합니다. 표현만 다른
+# 반복 질문("서울 인구?" vs "서울의 인구는?")에서 Team1 LLM 호출을 건너뜁니다.
+TEAM1_SEMANTIC_CACHE: bool = os.getenv("TEAM1_SEMANTIC_CACHE", "false").lower() == "true"
+TEAM1_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("TEAM1_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Team1 임베딩 평가: semantic_alignment와 rag_query_scores를 판정 LLM 대신
+# 임베딩 코사인 유사도로 계산합니다. 임베딩은 챗 완성보다 수십 배 싸고 빨라
+# 행복 경로의 Team1 LLM 호출이 2회→1회로 줄지만, 점수 분포가 LLM 채점과
+# 달라 임계치(0.8) 재검증이 필요하므로 기본은 비활성.
+TEAM1_EMBED_EVAL: bool = os.getenv("TEAM1_EMBED_EVAL", "false").lower() == "true"
+
+# Team1 융합 노드: 워커(생성)와 평가자(채점)를 JSON 스키마 하나로 합쳐
+# LLM 1회 호출로 처리합니다. 왕복 1회와 공유 컨텍스트의 prefill 1회가
+# 사라지지만, 자기 평가라 재시도 품질 신호가 약해지므로 기본은 비활성.
+# (자기 평가가 기준 미달이면 기존 2노드 경로로 폴백)
+TEAM1_FUSED: bool = os.getenv("TEAM1_FUSED", "false").lower() == "true"
+
+# Team1 투기적 실행: 워커 LLM 호출을 서로 다른 온도로 동시에 2회 실행하고,
+# 유효성 검사를 먼저 통과한 결과를 채택합니다. 직렬 재시도 대비 꼬리 지연을
+# 줄이지만 토큰 사용량이 2배가 되므로 기본은 비활성.
+TEAM1_SPECULATIVE: bool = os.getenv("TEAM1_SPECULATIVE", "false").lower() == "true"
+# 후보별 (온도, 쿼리 스타일 힌트): 같은 질문을 서로 다른 탐색 스타일로
+# 병렬 생성해 다양성을 확보합니다. 두 튜플의 길이는 같아야 합니다.
+TEAM1_SPECULATIVE_TEMPS: tuple = (0.0, 0.3, 0.7)
+TEAM1_SPECULATIVE_HINTS: tuple = (
+    "",
+    "STYLE HINT: favor keyword-style, term-dense search queries.",
+    "STYLE HINT: favor entity-focused queries centered on named entities and their relationships.",
+)
+
+# -----------------------------
+# 로깅
+# -----------------------------
+# 비동기 로깅: 핫 패스의 진행 로그를 print 대신 QueueHandler로 큐에 넣고,
+# 별도 리스너 스레드가 stdout에 씁니다. (동시 요청 시 stdout flush가
+# 직렬화 지점이 되는 것을 방지. 기본은 기존과 동일한 동기 print)
+ASYNC_LOGGING: bool = os.getenv("ASYNC_LOGGING", "false").lower() == "true"
 
 # -----------------------------
 # 제어 플로우(재시도/루프)
@@ -3,13 +3,13 @@
 from typing import Literal, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage, ToolMessage, HumanMessage
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
 
 import config
 from state import AgentState
+from utility_tools import get_chat_llm
 
 # --- 매니저 에이전트의 결정을 위한 Pydantic 스키마 ---
 class ManagerDecision(BaseModel):
@@ -18,42 +18,55 @@ class ManagerDecision(BaseModel):
     feedback: Optional[str] = Field(description="작업을 수정해야 할 경우, 해당 팀에게 전달할 구체적인 한글 피드백")
     reason: str = Field(description="결정에 대한 간단한 한글 요약")
 
-# --- 슈퍼그래프의 노드들 ---
-
-def manager_agent(state: AgentState) -> dict:
-
-    print("--- MANAGER: 작업 검토 및 다음 단계 결정 ---")
-
-    global_loop_count = state.get("global_loop_count", 0)
-    last_message = state['messages'][-1]
+# LLM 라우팅 프롬프트에 넣는 평가자 메시지 본문의 최대 길이.
+# 라우팅은 pass/fail 접두어와 짧은 사유만 보면 충분한데, 도구 실패 메시지에
+# 긴 본문이 딸려 오면 라우팅 호출의 프롬프트 토큰(=TTFT)을 불필요하게 키웁니다.
+_ROUTER_CONTENT_MAX = 500
 
-    last_name = getattr(last_message, 'name', 'N/A')
-    last_content = getattr(last_message, 'content', '')
+# --- 슈퍼그래프의 노드들 ---
 
+def _rule_based_decision(state: AgentState, last_name: str, last_content: str) -> Optional[tuple]:
+    """
+    평가자 메시지의 (name, content)만으로 다음 팀을 결정하는 결정적 라우팅 규칙.
+    4지선다 분기는 LLM 호출 없이 파이썬 분기로 충분합니다.
+    판단할 수 없는 비정상 상태면 None을 반환해 LLM 폴백으로 넘깁니다.
+    반환값: (next_team, feedback) 튜플.
+    """
+    content = str(last_content).strip()
+
+    if last_name == "team1_evaluator":
+        if content == "pass":
+            # 간단 질문이면 검색 없이 Team3 직행
+            if state.get("is_simple_query", "No") == "Yes":
+                return ("team3", None)
+            return ("team2", None)
+        if content.startswith("fail"):
+            return ("team1", f"질문 분석이 실패했습니다. 문제를 수정해주세요: {content}")
+
+    elif last_name == "team2_evaluator":
+        if content == "pass":
+            return ("team3", None)
+        if content.startswith("fail"):
+            # 문서 품질 미달은 대개 쿼리 문제 → Team1으로 되돌림
+            return ("team1", f"검색된 문서가 부족합니다. 검색 쿼리를 개선해주세요: {content}")
+
+    elif last_name == "team3_evaluator":
+        if content == "pass":
+            return ("end", None)
+        if content.startswith("fail"):
+            return ("team3", f"답변 품질이 미달입니다. 답변을 수정해주세요: {content}")
+
+    # 워커 노드의 도구 실패 등 — 진행 불가
+    if content.startswith("fail"):
+        return ("end", None)
+
+    return None
+
+
+def _llm_based_decision(state: AgentState, last_name: str, last_content: str) -> tuple:
+    """기존 LLM 기반 라우팅. 규칙으로 판단 불가한 상태의 폴백으로만 사용됩니다."""
     user_question = next((msg.content for msg in state['messages'] if isinstance(msg, HumanMessage)), "")
 
-    try:
-        if last_name == "team1_evaluator" and str(last_content).strip() == "pass":
-            is_simple = state.get("is_simple_query", "No")
-            if is_simple == "Yes":
-                print("🧭 Manager 단축 라우팅: 간단질문 → Team3 직행")
-                return {
-                    "next_team_to_call": "team3",
-                    "manager_feedback": None,
-                    "global_loop_count": global_loop_count,
-                    "team3_retries": 0
-                }
-            else:
-                print("🧭 Manager 단축 라우팅: 일반질문 → Team2 탐색")
-                return {
-                    "next_team_to_call": "team2",
-                    "manager_feedback": None,
-                    "global_loop_count": global_loop_count,
-                    "team2_retries": 0
-                }
-    except Exception as e:
-        print(f"⚠️ is_simple_query 기반 라우팅 실패: {e} (기본 LLM 라우팅으로 진행)")
-
     parser = JsonOutputParser(p_object=ManagerDecision)
     prompt = PromptTemplate.from_template("""
 You are the project manager of a multi-agent RAG system. Your role is to review the work of your teams (Team1, Team2, Team3) and decide the next step with surgical precision.
@@ -90,30 +103,65 @@ Provide your decision in the following JSON format.
 {schema}
 """).partial(schema=parser.get_format_instructions())
 
-    llm = ChatOpenAI(model=config.LLM_MODEL_SUPER_ROUTER, temperature=0.0, model_kwargs={"response_format": {"type": "json_object"}})
+    llm = get_chat_llm(config.LLM_MODEL_SUPER_ROUTER, temperature=0.0, json_mode=True)
     chain = prompt | llm | parser
 
+    content = str(last_content)
+    if len(content) > _ROUTER_CONTENT_MAX:
+        content = content[:_ROUTER_CONTENT_MAX] + "...(truncated)"
+
+    result = chain.invoke({
+        "user_question": user_question,
+        "last_message_name": last_name,
+        "last_message_content": content
+    })
+
+    next_team = result.get("next_team", "end")
+    reason = result.get("reason", "LLM으로부터 이유를 받지 못했습니다.")
+    print(f"🧠 매니저 LLM 결정: {next_team}, 이유: {reason}")
+    return (next_team, result.get("feedback"))
+
+
+def _decide_next_team(state: AgentState, last_name: str, last_content: str) -> tuple:
+    """
+    설정된 라우터 백엔드에 따라 (next_team, feedback)을 결정합니다.
+    라우팅은 4지선다 분류 문제라 추후 경량 분류기 백엔드도 여기에 끼울 수 있습니다.
+    - "rules": 결정적 분기 우선, 판단 불가 시에만 LLM 폴백 (기본)
+    - "llm":   항상 LLM 라우팅 (A/B 비교용)
+    """
+    backend = getattr(config, "ROUTER_BACKEND", "rules")
+    if backend != "llm":
+        decision = _rule_based_decision(state, last_name, last_content)
+        if decision is not None:
+            print(f"🧭 매니저 규칙 결정: {decision[0]}")
+            return decision
+    return _llm_based_decision(state, last_name, last_content)
+
+
+def manager_agent(state: AgentState) -> dict:
+
+    print("--- MANAGER: 작업 검토 및 다음 단계 결정 ---")
+
+    global_loop_count = state.get("global_loop_count", 0)
+    last_message = state['messages'][-1]
+
+    last_name = getattr(last_message, 'name', 'N/A')
+    last_content = getattr(last_message, 'content', '')
+
     try:
-        result = chain.invoke({
-            "user_question": user_question,
-            "last_message_name": last_name,
-            "last_message_content": last_content
-        })
-        
-        next_team = result.get("next_team", "end")
-        reason = result.get("reason", "LLM으로부터 이유를 받지 못했습니다.")
-        feedback = result.get("feedback")
-
-        is_t1_loop = (getattr(last_message, 'name', 'N/A') == "team1_evaluator" and next_team == "team1")
-        is_t2_loop = (getattr(last_message, 'name', 'N/A') == "team2_evaluator" and next_team == "team1")
-        is_t3_loop = (getattr(last_message, 'name', 'N/A') == "team3_evaluator" and next_team == "team3")
-        
+        decision = _decide_next_team(state, last_name, last_content)
+
+        next_team, feedback = decision
+
+        is_t1_loop = (last_name == "team1_evaluator" and next_team == "team1")
+        is_t2_loop = (last_name == "team2_evaluator" and next_team == "team1")
+        is_t3_loop = (last_name == "team3_evaluator" and next_team == "team3")
+
         if is_t1_loop or is_t2_loop or is_t3_loop:
             global_loop_count += 1
             print(f"🔄 매니저가 백워드 루프를 감지했습니다. 글로벌 루프 카운트: {global_loop_count}")
             if global_loop_count >= config.MAX_GLOBAL_LOOPS:
                 print(f"❌ 글로벌 루프 제한({config.MAX_GLOBAL_LOOPS}회)을 초과하여 프로세스를 종료합니다.")
-                # next_team = "end" # Override the decision and force termination
                 feedback = "Process terminated to prevent an infinite loop."
                 error_content = f"죄송합니다. 내부 처리 한도를 초과하여 답변을 생성할 수 없습니다. 질문을 바꿔서 다시 시도해 주세요."
                 return {
@@ -123,8 +171,6 @@ Provide your decision in the following JSON format.
                     "messages": [AIMessage(content=error_content)]
                 }
 
-        print(f"🧠 매니저 결정: {next_team}, 이유: {reason}")
-        
         update_dict = {
             "next_team_to_call": next_team,
             "manager_feedback": feedback,
@@ -138,14 +184,43 @@ Provide your decision in the following JSON format.
             update_dict["team2_retries"] = 0
         elif next_team == "team3":
             update_dict["team3_retries"] = 0
-        
+
         return update_dict
-    
+
     except Exception as e:
         print(f"❌ 매니저 에이전트 오류: {e}")
         return {"next_team_to_call": "end", "manager_feedback": "매니저 에이전트 실행 중 오류가 발생했습니다."}
 
 
+def _route_after_team(state: AgentState) -> str:
+    """
+    융합 라우터: 팀 노드 종료 직후 결정적 규칙으로 다음 목적지를 판정합니다.
+    피드백 전달·글로벌 루프 카운트·재시도 초기화가 필요 없는 '전진(pass)'
+    전이만 매니저를 생략하고 직행합니다. 그 외(fail/백워드/판단 불가)는
+    기존대로 매니저 노드를 경유해 상태 갱신을 수행합니다.
+    """
+    last_message = state['messages'][-1]
+    last_name = getattr(last_message, 'name', 'N/A')
+    last_content = getattr(last_message, 'content', '')
+
+    decision = _rule_based_decision(state, last_name, last_content)
+    if decision is not None:
+        next_team, feedback = decision
+        is_forward = feedback is None and (
+            (last_name == "team1_evaluator" and next_team in ("team2", "team3"))
+            or (last_name == "team2_evaluator" and next_team == "team3")
+            or (last_name == "team3_evaluator" and next_team == "end")
+        )
+        # 목적지 팀의 재시도 카운트가 남아 있으면 매니저가 초기화하도록 경유.
+        # 이전 라운드의 manager_feedback이 상태에 남아 있어도 경유합니다 —
+        # 매니저 홉이 피드백을 None으로 덮어쓰는 유일한 지점이라, 생략하면
+        # 철 지난 피드백이 다음 팀(특히 Team3 생성 프롬프트)에 주입됩니다.
+        if is_forward and state.get(f"{next_team}_retries", 0) == 0 and not state.get("manager_feedback"):
+            print(f"🚦 융합 라우터: 매니저 생략, '{next_team}' 직행")
+            return next_team
+    return "manager"
+
+
 def create_super_graph(team1_app, team2_app, team3_app):
     """
     매니저 에이전트를 중심으로 모든 팀 서브그래프를 통합하는 슈퍼그래프를 생성합니다.
@@ -159,9 +234,23 @@ def create_super_graph(team1_app, team2_app, team3_app):
 
     builder.set_entry_point("team1")
 
-    builder.add_edge("team1", "manager")
-    builder.add_edge("team2", "manager")
-    builder.add_edge("team3", "manager")
+    # 융합 라우팅: pass 직후의 팀 전환은 매니저 노드를 건너뛰어
+    # 실제 작업 사이의 제어 노드 왕복을 제거합니다.
+    if getattr(config, "SUPER_FUSED_ROUTING", False) and getattr(config, "ROUTER_BACKEND", "rules") != "llm":
+        fused_map = {
+            "team1": "team1",
+            "team2": "team2",
+            "team3": "team3",
+            "end": END,
+            "manager": "manager",
+        }
+        builder.add_conditional_edges("team1", _route_after_team, fused_map)
+        builder.add_conditional_edges("team2", _route_after_team, fused_map)
+        builder.add_conditional_edges("team3", _route_after_team, fused_map)
+    else:
+        builder.add_edge("team1", "manager")
+        builder.add_edge("team2", "manager")
+        builder.add_edge("team3", "manager")
 
     def route_from_manager(state: AgentState) -> str:
         next_team = state.get("next_team_to_call")
@@ -2,7 +2,8 @@
 
 from langgraph.graph import StateGraph, END
 from state import AgentState
-from agents.team1_agents import process_question, evaluate_question
+import config
+from agents.team1_agents import process_question, evaluate_question, process_and_evaluate_question
 
 def create_team1_graph():
     """
@@ -10,6 +11,27 @@ def create_team1_graph():
     """
     builder = StateGraph(AgentState)
 
+    if getattr(config, "TEAM1_FUSED", False):
+        # 융합 모드: 워커+평가자를 한 노드(LLM 1회 호출)로. 재시도(retry)는
+        # 노드 내부에서 2단계 경로로 폴백하므로 자기 자신으로 되돌립니다.
+        builder.add_node("process_and_evaluate", process_and_evaluate_question)
+        builder.set_entry_point("process_and_evaluate")
+
+        def route_after_fused(state: AgentState) -> str:
+            last_message = state['messages'][-1]
+            if last_message.content.startswith("retry"):
+                print("🚦 라우터: Team 1(융합) 재시도 결정.")
+                return "process_and_evaluate"
+            print("🚦 라우터: Team 1(융합) 종료 결정.")
+            return END
+
+        builder.add_conditional_edges(
+            "process_and_evaluate",
+            route_after_fused,
+            {"process_and_evaluate": "process_and_evaluate", END: END}
+        )
+        return builder.compile()
+
     builder.add_node("process_question", process_question)
     builder.add_node("evaluate_question", evaluate_question)
 
@@ -18,8 +40,12 @@ def create_team1_graph():
     
     def route_after_evaluation(state: AgentState) -> str:
         last_message = state['messages'][-1]
-        
-        if last_message.content.startswith("retry"):
+
+        if last_message.content.startswith("retry_eval"):
+            # 워커 결과는 유효하고 평가자만 실패한 경우 — 워커 재실행을 생략
+            print("🚦 라우터: Team 1 평가만 재시도 결정.")
+            return "evaluate_question"
+        elif last_message.content.startswith("retry"):
             print("🚦 라우터: Team 1 재시도 결정.")
             return "process_question"
         else:
@@ -31,6 +57,7 @@ def create_team1_graph():
         route_after_evaluation,
         {
             "process_question": "process_question",
+            "evaluate_question": "evaluate_question",
             END: END
         }
     )
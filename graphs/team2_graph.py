@@ -2,8 +2,9 @@
 
 from langgraph.graph import StateGraph, END
 
+import config
 from state import AgentState
-from agents.team2_agents import rag_search, web_search, evaluate_documents
+from agents.team2_agents import rag_search, web_search, parallel_search, evaluate_documents
 
 
 
@@ -15,9 +16,16 @@ def create_team2_graph():
 
     builder.add_node("rag_search", rag_search)
     builder.add_node("web_search", web_search)
+    builder.add_node("parallel_search", parallel_search)
     builder.add_node("evaluate_documents", evaluate_documents)
 
-    builder.set_entry_point("rag_search")
+    # 병렬 검색이 켜져 있으면 RAG/웹을 동시에 실행하는 노드로 진입합니다.
+    # (재시도 경로는 기존 순차 노드를 그대로 사용)
+    if config.TEAM2_PARALLEL_SEARCH:
+        builder.set_entry_point("parallel_search")
+    else:
+        builder.set_entry_point("rag_search")
+    builder.add_edge("parallel_search", "evaluate_documents")
     builder.add_edge("rag_search", "evaluate_documents")
     builder.add_edge("web_search", "evaluate_documents")
     
@@ -32,9 +40,12 @@ def create_team2_graph():
         
         if decision == "retry_rag":
             return "rag_search"
-        elif decision == "fallback_to_web":
-            return "web_search"
-        elif decision == "retry_web":
+        elif decision in ("fallback_to_web", "retry_web"):
+            # 병렬 모드에서는 재시도/폴백도 RAG+웹 동시 라운드로 수행합니다.
+            # 순차 모드의 최악 지연(T_rag*2 + T_web*2)이 max(T_rag, T_web)*라운드 수로
+            # 줄어들고, RAG 쪽은 결정적이라 평가 캐시에 적중해 사실상 무비용입니다.
+            if config.TEAM2_PARALLEL_SEARCH:
+                return "parallel_search"
             return "web_search"
         else:
             return END
@@ -45,6 +56,7 @@ def create_team2_graph():
         {
             "rag_search": "rag_search",
             "web_search": "web_search",
+            "parallel_search": "parallel_search",
             END: END
         }
     )
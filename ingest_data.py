@@ -9,8 +9,10 @@ PDF 인덱싱 파이프라인 (PyMuPDF4LLM + OCR)
 
 from __future__ import annotations
 
+import functools
 import os
 import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Optional
 
@@ -19,6 +21,15 @@ import pymupdf4llm
 from PIL import Image
 import pytesseract
 
+# tesserocr(libtesseract C 바인딩)가 있으면 엔진을 프로세스 내에 상주시켜
+# 이미지마다 tesseract 서브프로세스를 fork+exec 하는 비용(~100ms/장)을 없앱니다.
+# 설치돼 있지 않으면 기존 pytesseract 경로로 폴백합니다.
+try:
+    from tesserocr import PyTessBaseAPI
+    _TESSEROCR_AVAILABLE = True
+except ImportError:
+    _TESSEROCR_AVAILABLE = False
+
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
@@ -32,12 +43,42 @@ OCR_MIN_W = getattr(config, "OCR_MIN_W", 200)          # OCR 대상 최소 이
 OCR_MIN_H = getattr(config, "OCR_MIN_H", 200)          # OCR 대상 최소 이미지 세로
 PAGE_OCR_ENABLE = getattr(config, "PAGE_OCR_ENABLE", True)   # 페이지 렌더 OCR 폴백 사용
 PAGE_OCR_SCALE = getattr(config, "PAGE_OCR_SCALE", 2.0)      # 렌더링 스케일(2.0≈~200~300dpi)
+# PDF 파싱/OCR 병렬 워커 수 (파싱+Tesseract는 서로 독립이라 프로세스 병렬화 가능)
+INGEST_WORKERS = getattr(config, "INGEST_WORKERS", min(4, os.cpu_count() or 1))
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
 # ================================================================
 
 
+@functools.lru_cache(maxsize=1)
+def _get_embeddings() -> OpenAIEmbeddings:
+    """
+    임베딩 클라이언트를 프로세스당 한 번만 생성합니다.
+    (테스트/증분 ingest 처럼 반복 호출 시 클라이언트 재초기화 방지)
+    """
+    return OpenAIEmbeddings(
+        model=getattr(config, "OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"),
+        dimensions=getattr(config, "OPENAI_EMBEDDING_DIMENSIONS", None),
+        chunk_size=getattr(config, "EMBED_BATCH_SIZE", 128),
+    )
+
+
+# 프로세스당 하나의 OCR 엔진 인스턴스 (ProcessPoolExecutor 워커별로 독립 생성)
+_tess_api: Optional["PyTessBaseAPI"] = None
+
+
+def _ocr_image(pil: Image.Image) -> str:
+    """이미지 한 장을 OCR 합니다. tesserocr 우선, 없으면 pytesseract."""
+    global _tess_api
+    if _TESSEROCR_AVAILABLE:
+        if _tess_api is None:
+            _tess_api = PyTessBaseAPI(lang=OCR_LANG)
+        _tess_api.SetImage(pil)
+        return _tess_api.GetUTF8Text() or ""
+    return pytesseract.image_to_string(pil, lang=OCR_LANG) or ""
+
+
 def _as_doc(text: str, source: str, **meta) -> Document:
     return Document(page_content=text, metadata={"source": source, **meta})
 
@@ -59,10 +100,23 @@ def _dedup_docs(docs: List[Document]) -> List[Document]:
 # ──────────────────────────────
 def extract_text_with_pymupdf4llm(pdf_path: str) -> List[Document]:
     try:
-        md = pymupdf4llm.to_markdown(pdf_path)
-        if md and md.strip():
-            return [_as_doc(md, pdf_path, parser="pymupdf4llm", type="markdown")]
-        return []
+        # page_chunks=True: 문서 전체를 하나의 거대한 Markdown 문자열로 들고 있지 않고
+        # 페이지 단위로 순회하며 Document를 만듭니다.
+        # (대형 PDF에서 피크 메모리 감소 + page 메타데이터 확보)
+        pages = pymupdf4llm.to_markdown(pdf_path, page_chunks=True)
+        docs: List[Document] = []
+        for page in pages:
+            text = (page.get("text") or "").strip()
+            if not text:
+                continue
+            meta = page.get("metadata") or {}
+            docs.append(_as_doc(
+                text, pdf_path,
+                parser="pymupdf4llm",
+                type="markdown",
+                page=meta.get("page"),
+            ))
+        return docs
     except Exception as e:
         print(f"[warn] PyMuPDF4LLM 실패: {pdf_path} -> {e}")
         return []
@@ -104,8 +158,7 @@ def ocr_images_in_pdf(pdf_path: str) -> List[Document]:
                     continue
 
                 pil = Image.open(io.BytesIO(img_bytes))
-                text = pytesseract.image_to_string(pil, lang=OCR_LANG) or ""
-                text = text.strip()
+                text = _ocr_image(pil).strip()
                 if text:
                     docs.append(_as_doc(
                         text=text,
@@ -143,8 +196,7 @@ def ocr_pages_rendered(pdf_path: str) -> List[Document]:
             pix = doc[page_index].get_pixmap(matrix=mat)
             mode = "RGBA" if pix.alpha else "RGB"
             pil = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-            text = pytesseract.image_to_string(pil, lang=OCR_LANG) or ""
-            text = text.strip()
+            text = _ocr_image(pil).strip()
             if text:
                 docs.append(_as_doc(
                     text=text,
@@ -193,14 +245,28 @@ def load_documents(source_dir: str = "data") -> List[Document]:
         print(f"[warn] PDF 없음: {source_dir}")
         return all_docs
 
-    for p in pdf_paths:
-        try:
-            parsed = parse_pdf(str(p))
-            if not parsed:
-                print(f"[warn] 파싱 결과 없음: {p}")
-            all_docs.extend(parsed)
-        except Exception as e:
-            print(f"[warn] 파싱 실패: {p} -> {e}")
+    # PDF 파싱 + OCR은 파일 단위로 독립적이므로 프로세스 풀로 병렬 처리
+    if INGEST_WORKERS > 1 and len(pdf_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(INGEST_WORKERS, len(pdf_paths))) as pool:
+            futures = {pool.submit(parse_pdf, str(p)): p for p in pdf_paths}
+            for fut in as_completed(futures):
+                p = futures[fut]
+                try:
+                    parsed = fut.result()
+                    if not parsed:
+                        print(f"[warn] 파싱 결과 없음: {p}")
+                    all_docs.extend(parsed)
+                except Exception as e:
+                    print(f"[warn] 파싱 실패: {p} -> {e}")
+    else:
+        for p in pdf_paths:
+            try:
+                parsed = parse_pdf(str(p))
+                if not parsed:
+                    print(f"[warn] 파싱 결과 없음: {p}")
+                all_docs.extend(parsed)
+            except Exception as e:
+                print(f"[warn] 파싱 실패: {p} -> {e}")
 
     return all_docs
 
@@ -222,19 +288,65 @@ def create_vector_store(source_dir: str = "data") -> None:
     chunks = splitter.split_documents(raw_docs)
     print(f"[ok] 문서 {len(raw_docs)}개 → 청크 {len(chunks)}개")
 
-    embeddings = OpenAIEmbeddings(
-        model=getattr(config, "OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"),
-        dimensions=getattr(config, "OPENAI_EMBEDDING_DIMENSIONS", None),
-        chunk_size=getattr(config, "EMBED_BATCH_SIZE", 128),
-    )
+    embeddings = _get_embeddings()
+
+    # 청크를 배치 단위로 인덱스에 증분 추가합니다.
+    # 전체 코퍼스를 한 번에 임베딩하며 블로킹하는 대신, 임베딩 호출과
+    # 인덱스 구축이 배치마다 번갈아 진행되어 진행 상황도 확인할 수 있습니다.
+    index_batch = getattr(config, "INDEX_ADD_BATCH", 256)
+    vs: Optional[FAISS] = None
+    for i in range(0, len(chunks), index_batch):
+        part = chunks[i:i + index_batch]
+        if vs is None:
+            vs = FAISS.from_documents(part, embeddings)
+        else:
+            vs.add_documents(part)
+        print(f"[ok] 인덱스 진행: {min(i + index_batch, len(chunks))}/{len(chunks)}")
+
+    if getattr(config, "FAISS_USE_IVFPQ", False):
+        _maybe_convert_to_ivfpq(vs)
 
-    vs = FAISS.from_documents(chunks, embeddings)
     save_path = getattr(config, "VECTOR_STORE_PATH", getattr(config, "VECTOR_DB_PATH", "vector_store"))
     Path(save_path).mkdir(parents=True, exist_ok=True)
     vs.save_local(save_path)
     print(f"[ok] FAISS 저장 완료: {save_path}")
 
 
+def _maybe_convert_to_ivfpq(vs: FAISS) -> None:
+    """
+    (FAISS_USE_IVFPQ=true) 전수 스캔 FlatIP 인덱스를 IVF-PQ로 변환합니다.
+    벡터를 8비트 PQ 코드로 압축해 메모리를 크게 줄이고, 검색은 nprobe개의
+    클러스터만 조사하는 서브리니어 스캔이 됩니다. 코퍼스가 작으면(전수 스캔도
+    충분히 빠름) 근사 손실만 생기므로 임계치 미만에서는 변환하지 않습니다.
+    """
+    import faiss
+    import numpy as np
+
+    flat = vs.index
+    n, d = flat.ntotal, flat.d
+    min_vectors = getattr(config, "FAISS_IVFPQ_MIN_VECTORS", 20000)
+    if n < min_vectors:
+        print(f"[ok] IVF-PQ 변환 생략: 벡터 {n}개 < 임계치 {min_vectors} (FlatIP 유지)")
+        return
+    if d % 16 != 0:
+        print(f"[warn] IVF-PQ 변환 생략: 차원 {d}이 서브벡터 수(16)로 나눠지지 않음")
+        return
+
+    # nlist ≈ 4√N (FAISS 권장 범위), 상한 4096
+    nlist = min(4096, max(64, int(4 * n ** 0.5)))
+    quantizer = faiss.IndexFlatIP(d)
+    index = faiss.IndexIVFPQ(quantizer, d, nlist, 16, 8, faiss.METRIC_INNER_PRODUCT)
+
+    # 재구성한 원본 벡터로 학습/추가 — add 순서가 0..n-1로 보존되므로
+    # index_to_docstore_id 매핑은 그대로 유효합니다.
+    vecs = np.ascontiguousarray(flat.reconstruct_n(0, n))
+    index.train(vecs)
+    index.add(vecs)
+    index.nprobe = getattr(config, "FAISS_IVF_NPROBE", 16)
+    vs.index = index
+    print(f"[ok] IVF-PQ 변환 완료: 벡터 {n}개, nlist={nlist}, nprobe={index.nprobe}")
+
+
 if __name__ == "__main__":
     create_vector_store()
 
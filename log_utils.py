@@ -0,0 +1,48 @@
+# log_utils.py
+"""
+핫 패스용 진행 로그 헬퍼.
+
+기본(ASYNC_LOGGING=false)에서는 기존과 동일하게 print로 동작합니다.
+ASYNC_LOGGING=true면 QueueHandler + QueueListener 조합으로 로그를 큐에만
+넣고(O(enqueue)), 별도 스레드가 stdout에 씁니다 — 동시 요청 환경에서
+stdout flush가 GIL을 쥔 채 직렬화 지점이 되는 것을 막습니다.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+import config
+
+_listener = None
+_logger = None
+
+
+def _get_async_logger() -> logging.Logger:
+    global _listener, _logger
+    if _logger is not None:
+        return _logger
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    _logger = logging.getLogger("agentexpert.progress")
+    _logger.setLevel(logging.INFO)
+    _logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _logger.propagate = False
+    return _logger
+
+
+def log(msg: str) -> None:
+    """진행 로그 한 줄. 플래그에 따라 print 또는 비동기 로거로 내보냅니다."""
+    if getattr(config, "ASYNC_LOGGING", False):
+        _get_async_logger().info(msg)
+    else:
+        print(msg)
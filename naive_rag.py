@@ -1,10 +1,10 @@
 import json
 from langchain_core.messages import HumanMessage
 
-from agents.team1_agents import process_question, QuestionEvaluationResult
+from agents.team1_agents import process_question, _check_format_compliance, _get_question_eval_chain
 from agents.team2_agents import DocEvaluationResult
 from agents.team3_agents import generate_answer
-from utility_tools import vector_store_rag_search, format_docs
+from utility_tools import vector_store_rag_search, format_docs, json_dumps
 import config
 
 from langchain_core.output_parsers import JsonOutputParser
@@ -56,70 +56,19 @@ def run_naive_rag(user_question: str):
 
     # --- 3. Team1 Evaluator: 질문 처리 결과 평가 (점수 측정 전용) ---
     print("\n--- 2. 질문 처리 평가 (Team 1) ---")
-    t1_parser = JsonOutputParser(p_object=QuestionEvaluationResult)
-    t1_prompt = PromptTemplate.from_template("""
-You are the Team1 Supervisor evaluator. Using the information below, make binary judgments and per-query scores.
-
-[User Input]
-{user_input}
-
-[q_en_transformed]  # refined English question from the agent
-{q_en_transformed}
-
-[output_format]  # [type, language]
-{output_format}
-
-[default_format]
-{default_format}
-
-[rag_queries]
-{rag_queries_json}
-
-[Scoring Guide]
-
-You must evaluate the document using the following criteria.
-You must select only one of the predefined values. Do not output any intermediate values.
-
-1) semantic_alignment (float in [0,1])  
-   - Definition: How accurately `q_en_transformed` reflects the meaning and constraints of `user_input`.  
-   - Allowed values: {{0.00, 0.25, 0.50, 0.75, 1.00}}  
-     * 0.00 (None): completely irrelevant or incorrect  
-     * 0.25 (Low): only some keywords overlap, misses the core meaning/constraints  
-     * 0.50 (Partial): captures main meaning but lacks important constraints or nuance  
-     * 0.75 (Strong): satisfies most meaning/constraints with solid coverage, but small gaps remain  
-     * 1.00 (Exact): fully faithful to meaning/constraints, immediately usable  
-
-2) format_compliance (bool)  
-   - Definition: Whether the `output_format` matches the user’s requested format.  
-   - Decision process:  
-     a) Analyze `user_input`. Did the user explicitly request a format/language (e.g., "표로", "영어로", "in a table", "in English")?  
-     b) If YES → `format_compliance = true` only if `output_format` exactly matches the user’s request (ignore default_format).  
-     c) If NO → `format_compliance = true` only if `output_format` == `default_format`.  
-
-3) rag_query_scores (list[float])  
-   - Definition: For each `rag_query`, score how well it captures the user’s requirements (keywords, constraints, time ranges, numbers/units, search-friendliness).  
-   - Each value must be in [0.00, 1.00], continuous scale.  
-   - The length MUST equal len(rag_queries).  
-
-4) error_message (str)  
-   - If the document is empty, irrelevant, too generic, or duplicated → return a short note in Korean.  
-   - Otherwise return "" (empty string).
-                                          
-Return JSON ONLY. Do not include any additional text.
-
-Output schema:
-{schema}
-""").partial(schema=t1_parser.get_format_instructions())
-    t1_llm = ChatOpenAI(model=config.LLM_MODEL_TEAM1, temperature=0.0, model_kwargs={"response_format": {"type": "json_object"}})
-    t1_chain = t1_prompt | t1_llm | t1_parser
+    # 평가 체인/프롬프트를 여기서 재구성하지 않고 agents.team1_agents의
+    # 모듈 단일 인스턴스를 재사용합니다. (체인 1개, 캐시 풀 1개)
+    t1_chain = _get_question_eval_chain()
     try:
-        t1_eval_dict = t1_chain.invoke({
+        t1_eval = t1_chain.invoke({
             "user_input": user_question,
             "q_en_transformed": q_en_transformed,
-            "output_format": json.dumps(output_format, ensure_ascii=False),
-            "default_format": json.dumps(["qa", "ko"], ensure_ascii=False),
-            "rag_queries_json": json.dumps(rag_queries, ensure_ascii=False)
+            "output_format": json_dumps(output_format),
+            "rag_queries_json": json_dumps(rag_queries)
         })
+        t1_eval_dict = t1_eval.model_dump()
+        # 포맷 일치는 그래프 경로와 동일하게 결정적 검사로 판정
+        t1_eval_dict["format_compliance"] = _check_format_compliance(user_question, output_format)
         print("✅ Team 1 평가 완료:")
         print(json.dumps(t1_eval_dict, indent=2, ensure_ascii=False))
     except Exception as e:
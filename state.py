@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 from typing import TypedDict, Annotated, Optional, List, Literal
-from operator import add as list_concat
 
 from langgraph.graph.message import AnyMessage, add_messages
 from langchain_core.documents import Document
@@ -27,12 +26,30 @@ class AgentState(TypedDict, total=False):
     # Team1 Evaluator가 고른 최종 RAG 쿼리
     best_rag_query: Optional[str]
 
-    # Team2가 누적/평가해 모으는 문서 버킷
-    rag_docs: Annotated[List[Document], list_concat]
-    web_docs: Annotated[List[Document], list_concat]
+    # Team2가 누적/평가해 모으는 문서 버킷.
+    # 쓰는 쪽(Team2)이 항상 누적 전체를 돌려주므로 last-write-wins로 둡니다.
+    # (add 리듀서였을 때는 이전 누적분이 쓰기마다 중복 연결되는 문제가 있었음)
+    rag_docs: List[Document]
+    web_docs: List[Document]
+
+    # Team2 누적 버킷이 어느 쿼리 기준으로 쌓였는지. 새 Team1 쿼리가 오면
+    # 검색 노드가 버킷을 비우고, 같은 쿼리의 재시도 라운드면 유지합니다.
+    team2_accum_query: Optional[str]
 
     is_simple_query: Literal["Yes", "No"]
 
+    # Team2: 이미 판정한 문서의 내용 해시(16진 문자열) — 재시도/웹 폴백
+    # 라운드에서 같은 청크가 다시 들어와도 판정 호출을 반복하지 않기 위한 키
+    team2_seen_hashes: List[str]
+
+    # Team2: 채택 문서 본문 저장소 (doc_id → Document). pass 메시지에는
+    # 경량 핸들(id/카운트)만 실어 메시지 채널의 직렬화 비용을 줄입니다.
+    team2_docs_by_id: dict
+
+    # Team3: 직전 시도 답변의 내용 해시 — 재시도가 같은 답변을 다시 만들면
+    # 재판정(LLM) 없이 루프를 끊기 위한 키
+    team3_last_answer_hash: Optional[str]
+
     # 재시도/루프 카운터
     team1_retries: int
     team2_retries: int
@@ -1,5 +1,9 @@
 # utility_tools.py
 
+import functools
+import hashlib
+import itertools
+import json
 import os
 import torch
 from typing import List, Optional, Literal
@@ -23,15 +27,191 @@ import config
 # 공통 유틸
 # =========================================================
 
+# orjson이 설치돼 있으면 사용합니다. (loads 2-6×, dumps ~10× 빠르고
+# UTF-8 바이트를 직접 출력해 ensure_ascii 비용이 없음) 없으면 stdlib 폴백.
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+
+def json_dumps(obj) -> str:
+    """핫패스용 JSON 직렬화 (orjson 우선, ensure_ascii=False 동작과 동일)."""
+    if _orjson is not None:
+        return _orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def json_loads(s):
+    """핫패스용 JSON 파싱 (orjson 우선)."""
+    if _orjson is not None:
+        return _orjson.loads(s)
+    return json.loads(s)
+
+# format_docs 결과 메모: 재시도 루프나 생성→평가 연쇄에서는 같은 문서
+# 리스트가 (rag+web 결합 등으로 리스트 객체는 매번 새로 만들어지더라도)
+# 반복해서 들어오므로, 내용 해시를 키로 미리 만든 미리보기를 재사용합니다.
+# (id() 기반 키는 장수 프로세스에서 GC 후 주소가 재사용되면 이전 질문의
+# 미리보기를 돌려주는 오염이 가능해 내용 주소 방식으로 키를 만듭니다)
+_FORMAT_DOCS_MEMO: dict = {}
+_FORMAT_DOCS_MEMO_MAX = 8
+
+
+def _format_docs_memo_key(docs: List[Document], max_chars: int) -> tuple:
+    h = hashlib.blake2b(digest_size=16)
+    for d in docs:
+        if isinstance(d, Document) and d.page_content:
+            h.update(d.page_content.encode("utf-8", "ignore"))
+        h.update(b"\x1f")  # 원소 경계 구분자
+    return (h.hexdigest(), max_chars)
+
+
 def format_docs(docs: List[Document], max_chars: int = 15000) -> str:
     """
     LangChain Document 리스트를 프롬프트에 넣기 쉬운 하나의 문자열로 결합.
     """
-    contents = [d.page_content.strip() for d in docs if isinstance(d, Document) and d.page_content]
+    memo_key = _format_docs_memo_key(docs, max_chars)
+    cached = _FORMAT_DOCS_MEMO.get(memo_key)
+    if cached is not None:
+        return cached
+
+    # 어차피 max_chars에서 잘리므로, 전체 문서를 다 이어붙이지 않고
+    # 누적 길이가 한도를 넘는 순간 결합을 멈춥니다. (대량 검색 결과에서
+    # 중간 문자열의 피크 메모리와 불필요한 복사를 줄임)
+    sep = "\n\n---\n\n"
+    contents: List[str] = []
+    total = 0
+    truncated = False
+    for d in docs:
+        if not (isinstance(d, Document) and d.page_content):
+            continue
+        t = d.page_content.strip()
+        if not t:
+            continue
+        contents.append(t)
+        total += len(t) + len(sep)
+        if total > max_chars:
+            truncated = True
+            break
     if not contents:
         return "[NO CONTENT]"
-    joined = "\n\n---\n\n".join(contents)
-    return (joined[:max_chars] + "\n\n...[내용 일부 생략]...") if len(joined) > max_chars else joined
+    joined = sep.join(contents)
+    preview = (joined[:max_chars] + "\n\n...[내용 일부 생략]...") if truncated or len(joined) > max_chars else joined
+
+    if len(_FORMAT_DOCS_MEMO) >= _FORMAT_DOCS_MEMO_MAX:
+        _FORMAT_DOCS_MEMO.pop(next(iter(_FORMAT_DOCS_MEMO)))
+    _FORMAT_DOCS_MEMO[memo_key] = preview
+    return preview
+
+
+# tool_call_id는 프로세스 내 메시지 상관관계에만 쓰이므로 uuid4(urandom 16바이트
+# + 포맷팅) 대신 단조 증가 카운터로 충분합니다. pid 접두사로 프로세스 간 충돌 방지.
+_TOOL_CALL_COUNTER = itertools.count()
+_TOOL_CALL_PID = os.getpid()
+
+
+def next_tool_call_id() -> str:
+    """ToolMessage용 경량 tool_call_id 생성."""
+    return f"tc-{_TOOL_CALL_PID}-{next(_TOOL_CALL_COUNTER)}"
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """
+    문자열을 max_chars 이내로 중간 생략 방식으로 자릅니다.
+    판정용 미리보기는 머리(도입부)와 꼬리(결론부)에 신호가 몰리는 경우가 많아,
+    단순 앞부분 자르기보다 head+tail 유지가 판정 품질 손실이 적습니다.
+    """
+    if len(text) <= max_chars:
+        return text
+    marker = "\n...[중략]...\n"
+    keep = max_chars - len(marker)
+    if keep <= 0:
+        return text[:max_chars]
+    head = keep - keep // 2
+    tail = keep // 2
+    return text[:head] + marker + (text[-tail:] if tail else "")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_http_client():
+    """
+    모든 ChatOpenAI 인스턴스가 공유하는 httpx 커넥션 풀.
+    기본 클라이언트는 인스턴스마다 새 풀(HTTP/1.1)을 만들어, 작은 JSON 호출이
+    많은 이 파이프라인에서는 TCP/TLS 핸드셰이크가 호출당 수십 ms를 차지합니다.
+    keep-alive 풀 공유 + 가능하면 HTTP/2 멀티플렉싱으로 이를 제거합니다.
+    """
+    import httpx
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=30.0)
+    except ImportError:
+        # h2 미설치 시 HTTP/1.1 keep-alive 풀만으로도 공유 이득은 유지
+        return httpx.Client(limits=limits, timeout=30.0)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_async_http_client():
+    """
+    비동기 경로(ainvoke/gather)용 공유 httpx.AsyncClient.
+    HTTP/2 멀티플렉싱 덕에 한 라운드의 동시 LLM 호출들이 TCP 연결 하나 위에서
+    처리되어, 병렬 검색/투기적 실행 같은 fan-out 패턴에서 연결 수와
+    핸드셰이크가 줄어듭니다.
+
+    keep-alive는 의도적으로 끕니다(max_keepalive_connections=0): 동기 노드들이
+    라운드마다 asyncio.run()으로 새 이벤트 루프를 만들기 때문에, 유휴 연결을
+    풀에 남기면 닫힌 루프에 묶인 소켓이 다음 라운드에서 'Event loop is
+    closed'로 터집니다. 라운드 내 멀티플렉싱 이득은 유지되고, 라운드 간
+    재연결 비용만 지불합니다. (이 클라이언트는 lru 메모이즈된 ChatOpenAI에
+    구성 시점에 박히므로 루프별 클라이언트 캐시로는 해결되지 않음)
+    """
+    import httpx
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=0)
+    try:
+        return httpx.AsyncClient(http2=True, limits=limits, timeout=30.0)
+    except ImportError:
+        return httpx.AsyncClient(limits=limits, timeout=30.0)
+
+
+@functools.lru_cache(maxsize=1)
+def _setup_llm_cache() -> bool:
+    """
+    (옵션) LangChain 전역 LLM 응답 캐시를 SQLite로 1회 설정합니다.
+    temperature=0 + 고정 시드 호출은 결정적이므로, 같은 (모델, 프롬프트)의
+    반복 호출은 API를 건너뜁니다. LLM_SQLITE_CACHE_PATH가 비어 있으면 미설정.
+    """
+    path = getattr(config, "LLM_SQLITE_CACHE_PATH", "")
+    if not path:
+        return False
+    try:
+        from langchain_community.cache import SQLiteCache
+        from langchain_core.globals import set_llm_cache
+        set_llm_cache(SQLiteCache(database_path=path))
+        print(f"📦 LLM 응답 캐시(SQLite) 활성화: {path}")
+        return True
+    except Exception as e:
+        print(f"⚠️ LLM 응답 캐시 설정 실패(무시): {e}")
+        return False
+
+
+@functools.lru_cache(maxsize=8)
+def get_chat_llm(model: str, temperature: float = 0.0, json_mode: bool = False,
+                 max_tokens: Optional[int] = None) -> ChatOpenAI:
+    """
+    ChatOpenAI 클라이언트를 (model, temperature, json_mode, max_tokens) 단위로
+    메모이즈합니다. 매 호출마다 새로 만들면 인증/전송 설정과 httpx 커넥션 풀
+    웜업을 반복하므로, 핫패스에서는 이 헬퍼로 동일 설정의 클라이언트를
+    재사용합니다. (max_tokens는 응답이 짧다고 알려진 판정류 호출의 비용 상한용)
+    """
+    _setup_llm_cache()
+    # 고정 시드: temperature=0만으로는 출력이 완전히 결정적이지 않아,
+    # seed를 함께 전달해 재현성과 캐시 적중률을 높입니다.
+    model_kwargs = {"seed": getattr(config, "LLM_SEED", 42)}
+    if json_mode:
+        model_kwargs["response_format"] = {"type": "json_object"}
+    return ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens,
+                      model_kwargs=model_kwargs,
+                      http_client=_get_http_client(),
+                      http_async_client=_get_async_http_client())
 
 
 # =========================================================
@@ -47,12 +227,40 @@ _RERANKER_MODEL_NAME: str = getattr(
 
 _rerank_tokenizer = None
 _rerank_model = None
+_rerank_device = "cuda" if torch.cuda.is_available() else "cpu"
 
 if _USE_RERANKER:
     try:
-        print(f"[utility_tools] 리랭커 로드: {_RERANKER_MODEL_NAME}")
+        print(f"[utility_tools] 리랭커 로드: {_RERANKER_MODEL_NAME} ({_rerank_device})")
         _rerank_tokenizer = AutoTokenizer.from_pretrained(_RERANKER_MODEL_NAME)
-        _rerank_model = AutoModelForSequenceClassification.from_pretrained(_RERANKER_MODEL_NAME)
+        # ONNX Runtime 백엔드(옵션): eager PyTorch 대신 ORT 그래프로 forward.
+        # optimum 미설치/export 실패 시 아래 PyTorch 경로로 그대로 폴백합니다.
+        if getattr(config, "RERANKER_BACKEND", "torch").lower() == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForSequenceClassification
+                _rerank_model = ORTModelForSequenceClassification.from_pretrained(
+                    _RERANKER_MODEL_NAME, export=True
+                )
+                _rerank_device = "cpu"  # ORT가 EP를 내부에서 선택 — 입력은 CPU 텐서
+                print("[utility_tools] 리랭커 ONNX Runtime 백엔드 사용")
+            except Exception as onnx_err:
+                print(f"[utility_tools] ONNX 백엔드 실패 — PyTorch로 폴백: {onnx_err}")
+        # 양자화(옵션): GPU는 bf16 가중치 로드, CPU는 동적 int8 —
+        # 가중치당 이동 바이트를 절반 이하로 줄여 메모리 대역폭 병목을 완화.
+        # 점수 회귀 비교가 필요하면 플래그를 끄고 FP32로 되돌릴 수 있습니다.
+        _quantize = bool(getattr(config, "RERANKER_QUANTIZE", False))
+        if _rerank_model is None:
+            _dtype = torch.bfloat16 if (_quantize and _rerank_device == "cuda") else None
+            # eval(): dropout 비활성화 — 점수가 호출마다 흔들리지 않게 고정
+            _rerank_model = AutoModelForSequenceClassification.from_pretrained(
+                _RERANKER_MODEL_NAME, torch_dtype=_dtype
+            )
+            _rerank_model.to(_rerank_device).eval()
+            if _quantize and _rerank_device == "cpu":
+                _rerank_model = torch.ao.quantization.quantize_dynamic(
+                    _rerank_model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                print("[utility_tools] 리랭커 int8 동적 양자화 적용")
         print("[utility_tools] 리랭커 로드 완료")
     except Exception as e:
         print(f"[utility_tools] 리랭커 로드 실패: {e}")
@@ -65,13 +273,33 @@ if _USE_RERANKER:
 # Vector Store (FAISS) 로드
 # =========================================================
 
-def _load_faiss() -> FAISS:
-    emb = OpenAIEmbeddings(
+@functools.lru_cache(maxsize=1)
+def _get_embeddings() -> OpenAIEmbeddings:
+    """임베딩 클라이언트를 프로세스당 한 번만 생성합니다."""
+    return OpenAIEmbeddings(
         model=getattr(config, "OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"),
         dimensions=getattr(config, "OPENAI_EMBEDDING_DIMENSIONS", None),
     )
+
+
+@functools.lru_cache(maxsize=2048)
+def _embed_query_cached(query: str) -> tuple:
+    """쿼리 임베딩 메모이즈. 같은 rag_query가 재시도 라운드마다 반복되므로
+    임베딩 API 왕복을 프로세스 수명 동안 1회로 줄입니다."""
+    return tuple(_get_embeddings().embed_query(query))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_faiss() -> FAISS:
+    """FAISS 인덱스를 프로세스당 한 번만 디스크에서 로드해 핸들을 재사용합니다.
+    (호출마다 load_local을 반복하면 RAG 라운드마다 수백 ms의 순수 I/O 오버헤드)"""
+    emb = _get_embeddings()
     vs_path = getattr(config, "VECTOR_STORE_PATH", getattr(config, "VECTOR_DB_PATH", "vector_store"))
-    return FAISS.load_local(vs_path, emb, allow_dangerous_deserialization=True)
+    vs = FAISS.load_local(vs_path, emb, allow_dangerous_deserialization=True)
+    # IVF 계열 인덱스(ingest의 IVF-PQ 변환 산출물)면 조사 클러스터 수를 설정
+    if hasattr(vs.index, "nprobe"):
+        vs.index.nprobe = getattr(config, "FAISS_IVF_NPROBE", 16)
+    return vs
 
 
 def _dedup(docs: List[Document]) -> List[Document]:
@@ -86,13 +314,42 @@ def _dedup(docs: List[Document]) -> List[Document]:
     return out
 
 
+# (쿼리, 본문) 쌍 → 크로스 인코더 점수 메모. 재시도 라운드에서 같은 문서가
+# 같은 쿼리로 다시 걸리면 forward를 건너뜁니다. (모델은 결정적: eval 고정)
+# agents 패키지가 이 모듈을 import하므로, 순환을 피해 사용 시점에 지연 생성.
+_rerank_score_cache = None
+
+
+def _get_rerank_score_cache():
+    global _rerank_score_cache
+    if _rerank_score_cache is None:
+        from agents.eval_cache import EvalResultCache
+        _rerank_score_cache = EvalResultCache(maxsize=4096)
+    return _rerank_score_cache
+
+
 def _rerank(query: str, docs: List[Document], out_k: int) -> List[Document]:
     if not (_USE_RERANKER and _rerank_model and _rerank_tokenizer and docs):
         return docs[:out_k]
-    pairs = [(query, d.page_content) for d in docs]
-    inputs = _rerank_tokenizer(pairs, padding=True, truncation=True, return_tensors="pt", max_length=512)
-    with torch.no_grad():
-        scores = _rerank_model(**inputs).logits.squeeze().tolist()
+    cache = _get_rerank_score_cache()
+    keys = [cache.make_key(query, d.page_content) for d in docs]
+    scores: List = [cache.get(k) for k in keys]
+    miss = [i for i, s in enumerate(scores) if s is None]
+    if miss:
+        pairs = [(query, docs[i].page_content) for i in miss]
+        inputs = _rerank_tokenizer(pairs, padding=True, truncation=True, return_tensors="pt", max_length=512).to(_rerank_device)
+        # inference_mode: no_grad보다 한 단계 더 — 버전 카운터/뷰 추적까지 꺼서
+        # 순수 추론 forward의 오버헤드를 줄입니다.
+        with torch.inference_mode():
+            fresh = _rerank_model(**inputs).logits.squeeze().float().cpu().tolist()
+        if isinstance(fresh, float):
+            fresh = [fresh]
+        for i, s in zip(miss, fresh):
+            scores[i] = float(s)
+            cache.put(keys[i], float(s))
+    # 점수를 메타데이터에 남겨 하류(Team2 판정 우회 등)가 재활용할 수 있게 함
+    for s, d in zip(scores, docs):
+        d.metadata["rerank_score"] = float(s)
     ranked = [doc for _, doc in sorted(zip(scores, docs), key=lambda x: x[0], reverse=True)]
     return ranked[:out_k]
 
@@ -126,8 +383,10 @@ def vector_store_rag_search(
         out_k = int(rerank_k or cfg_topk)
         fetch_k = int(top_k or max(out_k * 2, cfg_topk * 2))
 
-        retriever = vs.as_retriever(search_kwargs={"k": fetch_k})
-        candidates: List[Document] = retriever.invoke(query)
+        # 임베딩을 메모이즈 경유로 구해 벡터 검색에 직접 주입합니다.
+        candidates: List[Document] = vs.similarity_search_by_vector(
+            list(_embed_query_cached(query)), k=fetch_k
+        )
 
         # 중복 제거 후 (옵션) 리랭킹
         uniq = _dedup(candidates)
@@ -163,7 +422,7 @@ def deep_research_web_search(query: str, max_results: int = 3) -> List[Document]
         return []
 
     try:
-        llm = ChatOpenAI(model=getattr(config, "LLM_MODEL_WEB", "gpt-4.1"), temperature=0)
+        llm = get_chat_llm(getattr(config, "LLM_MODEL_WEB", "gpt-4.1"), temperature=0.0)
         structured_llm = llm.with_structured_output(SearchResults)
 
         prompt = PromptTemplate.from_template(
@@ -223,7 +482,7 @@ def classify_simple_query(user_question: str) -> dict:
     LLM을 사용해 user_question이 '간단한 상식/개념적 질문'인지,
     아니면 '자료 검색/최신성/출처'가 필요한 질문인지 판정.
     """
-    llm = ChatOpenAI(model=getattr(config, "LLM_MODEL_TEAM1", "gpt-4.1"), temperature=0)
+    llm = get_chat_llm(getattr(config, "LLM_MODEL_TEAM1", "gpt-4.1"), temperature=0.0)
     prompt = ChatPromptTemplate.from_messages([
         ("system", 
         "You are a classifier. Classify whether the given user question can be answered "